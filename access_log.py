@@ -0,0 +1,45 @@
+import json
+import threading
+import time
+
+from flask import current_app, g, request
+
+#----------------------------------------------------------------------------#
+# Access Log Recording
+#----------------------------------------------------------------------------#
+
+# One JSON object per request, replayable with benchmarks/replay.py
+lock = threading.Lock()
+
+SKIP_FIELDS = ('csrf_token',)
+SKIP_ENDPOINTS = ('static', 'health.healthz', 'health.readyz')
+
+
+def start_timer():
+    g.access_log_start = time.perf_counter()
+
+
+def record_request(response):
+    if request.endpoint in SKIP_ENDPOINTS or 'access_log_start' not in g:
+        return response
+
+    entry = {
+        'ts': round(time.time(), 3),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'form': {k: v for k, v in request.form.lists() if k not in SKIP_FIELDS},
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - g.access_log_start) * 1000, 3),
+    }
+    line = json.dumps(entry, separators=(',', ':')) + '\n'
+    with lock:
+        with open(current_app.config['ACCESS_LOG_PATH'], 'a') as f:
+            f.write(line)
+
+    return response
+
+
+def init_app(app):
+    if app.config.get('ACCESS_LOG_PATH'):
+        app.before_request(start_timer)
+        app.after_request(record_request)
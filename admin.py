@@ -0,0 +1,266 @@
+import click
+from flask.cli import with_appcontext
+
+from models import db, Show, ShowArchive, ShowListing, Genre
+from search import ENTITIES
+from changelog import record_bulk
+from autocomplete import index as name_index
+from dedupe import fill_missing_keys, duplicate_clusters
+import matchmaking
+from popularity import popularity, show_weight, get_landmark, apply_deltas
+
+#----------------------------------------------------------------------------#
+# Set-based Operations
+#----------------------------------------------------------------------------#
+
+# Every operation runs a fixed number of statements in one transaction,
+# however many rows it touches. These bypass the ORM, so the show listing,
+# change log, popularity scores, autocomplete and match indexes are updated
+# here explicitly.
+
+shows = Show.__table__
+archive = ShowArchive.__table__
+listing = ShowListing.__table__
+
+
+def _existing_ids(model, ids):
+    return {r.id for r in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def _show_ids(fk, ids, table=shows):
+    return [r.id for r in db.session.query(table.c.id).filter(table.c[fk].in_(ids))]
+
+
+def _bump_versions(model, ids):
+    db.session.execute(
+        model.__table__.update().where(model.id.in_(ids)).values(version=model.version + 1)
+    )
+
+
+def _commit(kind, removed_ids=(), changed_ids=()):
+    try:
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+
+    if name_index.ready:
+        for id in removed_ids:
+            name_index.remove(kind, id)
+    for id in removed_ids:
+        matchmaking.index.remove(kind, id)
+    matchmaking.refresh(kind, list(changed_ids))
+    db.session.remove()
+
+
+def merge(entity, survivor_id, duplicate_ids):
+    # Fold duplicates into the survivor: move their shows and genres, then delete them
+    e = ENTITIES[entity]
+    model, assoc, owner = e['model'], e['assoc'], e['owner_id']
+    fk = owner.name
+    duplicate_ids = sorted(set(duplicate_ids) - {survivor_id})
+    if not duplicate_ids:
+        raise ValueError('No duplicates to merge')
+    missing = set(duplicate_ids) | {survivor_id}
+    missing -= _existing_ids(model, missing)
+    if missing:
+        raise ValueError(f'Unknown {entity} ids: {sorted(missing)}')
+
+    moved = _show_ids(fk, duplicate_ids)
+    moved_archived = _show_ids(fk, duplicate_ids, archive)
+
+    db.session.execute(
+        shows.update().where(shows.c[fk].in_(duplicate_ids)).values({fk: survivor_id})
+    )
+    db.session.execute(
+        archive.update().where(archive.c[fk].in_(duplicate_ids)).values({fk: survivor_id})
+    )
+
+    # Listing rows take the survivor's id and names
+    names = {f'{entity}_name': db.select([model.name]).where(model.id == survivor_id).as_scalar()}
+    if entity == 'artist':
+        names['artist_image_link'] = db.select([model.image_link]).where(model.id == survivor_id).as_scalar()
+    db.session.execute(
+        listing.update().where(listing.c[fk].in_(duplicate_ids)).values(dict(names, **{fk: survivor_id}))
+    )
+
+    # Union of genres, skipping ones the survivor already has
+    survivor_genres = db.select([assoc.c.genre_id]).where(owner == survivor_id)
+    db.session.execute(assoc.insert().from_select(
+        [fk, 'genre_id'],
+        db.select([db.literal(survivor_id), assoc.c.genre_id]).where(
+            owner.in_(duplicate_ids),
+        ).where(
+            assoc.c.genre_id.notin_(survivor_genres),
+        ).distinct(),
+    ))
+    db.session.execute(assoc.delete().where(owner.in_(duplicate_ids)))
+
+    # The survivor inherits the duplicates' popularity
+    inherited = db.select([db.func.coalesce(db.func.sum(popularity.c.score), 0)]).where(
+        popularity.c.kind == entity,
+    ).where(
+        popularity.c.entity_id.in_(duplicate_ids),
+    ).as_scalar()
+    db.session.execute(
+        popularity.update().where(popularity.c.kind == entity).where(
+            popularity.c.entity_id == survivor_id,
+        ).values(score=popularity.c.score + inherited)
+    )
+    db.session.execute(
+        popularity.delete().where(popularity.c.kind == entity).where(popularity.c.entity_id.in_(duplicate_ids))
+    )
+
+    db.session.execute(model.__table__.delete().where(model.id.in_(duplicate_ids)))
+    _bump_versions(model, [survivor_id])
+
+    record_bulk(db.session, Show, moved, 'update')
+    record_bulk(db.session, ShowArchive, moved_archived, 'update')
+    record_bulk(db.session, model, [survivor_id], 'update')
+    record_bulk(db.session, model, duplicate_ids, 'delete')
+    _commit(entity, duplicate_ids, [survivor_id])
+
+    return len(duplicate_ids), len(moved)
+
+
+def bulk_delete(entity, ids):
+    # Delete entities along with their shows, archived shows and genre links
+    e = ENTITIES[entity]
+    model, assoc, owner = e['model'], e['assoc'], e['owner_id']
+    fk = owner.name
+    ids = sorted(_existing_ids(model, ids))
+    if not ids:
+        return 0, 0
+
+    removed = _show_ids(fk, ids)
+    removed_archived = _show_ids(fk, ids, archive)
+
+    # Their shows no longer count towards the other side's popularity
+    other = 'artist' if entity == 'venue' else 'venue'
+    landmark = get_landmark(db.session)
+    deltas = {}
+    for table in (shows, archive):
+        rows = db.session.query(table.c[other + '_id'], table.c.start_time).filter(table.c[fk].in_(ids))
+        for other_id, start_time in rows:
+            deltas[(other, other_id)] = deltas.get((other, other_id), 0.0) - show_weight(start_time, landmark)
+    apply_deltas(db.session, deltas)
+    db.session.execute(
+        popularity.delete().where(popularity.c.kind == entity).where(popularity.c.entity_id.in_(ids))
+    )
+
+    db.session.execute(listing.delete().where(listing.c[fk].in_(ids)))
+    db.session.execute(archive.delete().where(archive.c[fk].in_(ids)))
+    db.session.execute(shows.delete().where(shows.c[fk].in_(ids)))
+    db.session.execute(assoc.delete().where(owner.in_(ids)))
+    db.session.execute(model.__table__.delete().where(model.id.in_(ids)))
+
+    record_bulk(db.session, Show, removed, 'delete')
+    record_bulk(db.session, ShowArchive, removed_archived, 'delete')
+    record_bulk(db.session, model, ids, 'delete')
+    _commit(entity, ids)
+
+    return len(ids), len(removed)
+
+
+def reassign_genre(entity, from_name, to_name):
+    # Move every link from one genre to another, e.g. to retire a genre
+    e = ENTITIES[entity]
+    model, assoc, owner = e['model'], e['assoc'], e['owner_id']
+    fk = owner.name
+    if from_name == to_name:
+        raise ValueError('Source and target genre are the same')
+
+    source = Genre.query.filter(Genre.name == from_name).first()
+    if not source:
+        raise ValueError(f'Unknown genre: {from_name}')
+    target = Genre.query.filter(Genre.name == to_name).first()
+    if not target:
+        target = Genre(name=to_name)
+        db.session.add(target)
+        db.session.flush()
+
+    affected = [r[0] for r in db.session.query(owner).filter(assoc.c.genre_id == source.id)]
+    if not affected:
+        db.session.rollback()
+        return 0
+
+    has_target = db.select([owner]).where(assoc.c.genre_id == target.id)
+    db.session.execute(assoc.insert().from_select(
+        [fk, 'genre_id'],
+        db.select([owner, db.literal(target.id)]).where(
+            assoc.c.genre_id == source.id,
+        ).where(
+            owner.notin_(has_target),
+        ),
+    ))
+    db.session.execute(assoc.delete().where(assoc.c.genre_id == source.id))
+    _bump_versions(model, affected)
+
+    record_bulk(db.session, model, affected, 'update')
+    _commit(entity, changed_ids=affected)
+
+    return len(affected)
+
+#----------------------------------------------------------------------------#
+# Commands
+#----------------------------------------------------------------------------#
+
+entity_choice = click.Choice(sorted(ENTITIES))
+
+
+@click.group('admin')
+def admin_command():
+    """Bulk clean-up of venues and artists."""
+
+
+@admin_command.command('merge')
+@click.argument('entity', type=entity_choice)
+@click.argument('survivor_id', type=int)
+@click.argument('duplicate_ids', type=int, nargs=-1, required=True)
+@with_appcontext
+def merge_command(entity, survivor_id, duplicate_ids):
+    try:
+        merged, moved = merge(entity, survivor_id, duplicate_ids)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Merged {merged} {entity}s into {entity} {survivor_id}, moving {moved} shows.')
+
+
+@admin_command.command('delete')
+@click.argument('entity', type=entity_choice)
+@click.argument('ids', type=int, nargs=-1, required=True)
+@with_appcontext
+def delete_command(entity, ids):
+    deleted, removed = bulk_delete(entity, ids)
+    click.echo(f'Deleted {deleted} {entity}s and {removed} of their shows.')
+
+
+@admin_command.command('reassign-genre')
+@click.argument('entity', type=entity_choice)
+@click.argument('from_name')
+@click.argument('to_name')
+@with_appcontext
+def reassign_genre_command(entity, from_name, to_name):
+    try:
+        moved = reassign_genre(entity, from_name, to_name)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Moved {moved} {entity}s from "{from_name}" to "{to_name}".')
+
+
+@admin_command.command('find-duplicates')
+@click.argument('entity', type=entity_choice)
+@with_appcontext
+def find_duplicates_command(entity):
+    model = ENTITIES[entity]['model']
+    filled = fill_missing_keys(model)
+    if filled:
+        click.echo(f'Computed blocking keys for {filled} {entity}s.')
+
+    clusters = duplicate_clusters(model)
+    for cluster in clusters:
+        click.echo(', '.join(f'{id}: {name}' for id, name in cluster))
+        click.echo(f'  flask admin merge {entity} ' + ' '.join(str(id) for id, _ in cluster))
+    click.echo(f'Found {len(clusters)} clusters of likely duplicate {entity}s.')
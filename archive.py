@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db, Show, ShowArchive
+from helpers import time_now
+
+#----------------------------------------------------------------------------#
+# Show History
+#----------------------------------------------------------------------------#
+
+def show_history():
+    # Live and archived shows together, for pages that list past shows
+    shows = Show.__table__
+    archive = ShowArchive.__table__
+
+    return db.union_all(
+        db.select([shows.c.id, shows.c.start_time, shows.c.venue_id, shows.c.artist_id]),
+        db.select([archive.c.id, archive.c.start_time, archive.c.venue_id, archive.c.artist_id]),
+    ).alias('show_history')
+
+#----------------------------------------------------------------------------#
+# Archiving
+#----------------------------------------------------------------------------#
+
+def archive_shows(cutoff):
+    # Move shows older than the cutoff in one transaction
+    shows = Show.__table__
+    archive = ShowArchive.__table__
+    old_shows = db.select([
+        shows.c.id,
+        shows.c.start_time,
+        shows.c.venue_id,
+        shows.c.artist_id,
+    ]).where(
+        shows.c.start_time < cutoff,
+    )
+
+    try:
+        moved = db.session.execute(
+            archive.insert().from_select(
+                ['id', 'start_time', 'venue_id', 'artist_id'],
+                old_shows,
+            )
+        ).rowcount
+        # Only the rows just copied; shows committed since still match the cutoff
+        db.session.execute(
+            shows.delete().where(shows.c.id.in_(db.select([archive.c.id])))
+        )
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+
+    return moved
+
+
+@click.command('archive-shows')
+@click.option('--days', type=int, default=None,
+              help='Archive shows that started more than this many days ago.')
+@with_appcontext
+def archive_shows_command(days):
+    if days is None:
+        days = current_app.config.get('SHOW_RETENTION_DAYS', 365)
+    cutoff = time_now() - timedelta(days=days)
+    moved = archive_shows(cutoff)
+    click.echo(f'Archived {moved} shows that started before {cutoff:%Y-%m-%d}.')
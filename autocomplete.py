@@ -0,0 +1,173 @@
+import bisect
+import heapq
+import json
+import threading
+
+from models import db, Venue, Artist
+from changelog import Follower, settle_time
+
+#----------------------------------------------------------------------------#
+# Prefix Index
+#----------------------------------------------------------------------------#
+
+KINDS = {Venue: 'venue', Artist: 'artist'}
+
+
+def fold(text):
+    return ' '.join((text or '').casefold().split())
+
+
+class PrefixIndex:
+    def __init__(self):
+        # A sorted list of (key, id) per kind, so that searches for one kind
+        # never step over the other's entries; each name is indexed once per
+        # word so that "hop" also finds "The Musical Hop"
+        self.keys = {kind: [] for kind in KINDS.values()}
+        self.names = {}
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def _entries(self, id, name):
+        words = fold(name).split(' ')
+        return [(' '.join(words[i:]), id) for i in range(len(words)) if words[i]]
+
+    def build(self, rows):
+        keys = {kind: [] for kind in KINDS.values()}
+        names = {}
+        for kind, id, name in rows:
+            names[(kind, id)] = name
+            keys[kind].extend(self._entries(id, name))
+        for entries in keys.values():
+            entries.sort()
+        with self.lock:
+            self.keys = keys
+            self.names = names
+            self.ready = True
+
+    def _discard(self, kind, id):
+        name = self.names.pop((kind, id), None)
+        if name is None:
+            return
+        keys = self.keys[kind]
+        for entry in self._entries(id, name):
+            i = bisect.bisect_left(keys, entry)
+            if i < len(keys) and keys[i] == entry:
+                del keys[i]
+
+    def add(self, kind, id, name):
+        with self.lock:
+            self._discard(kind, id)
+            if not name:
+                return
+            self.names[(kind, id)] = name
+            for entry in self._entries(id, name):
+                bisect.insort(self.keys[kind], entry)
+
+    def remove(self, kind, id):
+        with self.lock:
+            self._discard(kind, id)
+
+    def _matches(self, kind, prefix):
+        # (key, kind, id) for every key of this kind starting with the prefix
+        keys = self.keys[kind]
+        i = bisect.bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            yield keys[i][0], kind, keys[i][1]
+            i += 1
+
+    def search(self, prefix, kind=None, limit=10):
+        prefix = fold(prefix)
+        if not prefix or (kind is not None and kind not in self.keys):
+            return []
+
+        results = []
+        seen = set()
+        with self.lock:
+            kinds = [kind] if kind is not None else sorted(self.keys)
+            # Both kinds together come out in key order, as one list would
+            for key, k, id in heapq.merge(*(self._matches(k, prefix) for k in kinds)):
+                if len(results) >= limit:
+                    break
+                if (k, id) not in seen:
+                    seen.add((k, id))
+                    results.append((k, id, self.names[(k, id)]))
+
+        return results
+
+
+index = PrefixIndex()
+
+#----------------------------------------------------------------------------#
+# Loading & Sync
+#----------------------------------------------------------------------------#
+
+def build_index():
+    follower.reset(settle_time())
+    rows = []
+    for model, kind in KINDS.items():
+        rows.extend(
+            (kind, r.id, r.name)
+            for r in db.session.query(model.id, model.name)
+        )
+    index.build(rows)
+
+
+def ensure_index():
+    if not index.ready:
+        build_index()
+
+
+def _apply_log(changes):
+    for change in changes:
+        if change.entity not in index.keys:
+            continue
+        if change.op == 'delete':
+            index.remove(change.entity, change.entity_id)
+        else:
+            index.add(change.entity, change.entity_id, json.loads(change.data)['name'])
+
+
+follower = Follower(_apply_log)
+
+
+def sync_index():
+    # Applies writes committed by other workers, which the commit hooks below
+    # never see
+    if not index.ready:
+        build_index()
+    else:
+        follower.catch_up(settle_time())
+
+
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault('autocomplete_changes', {})
+    for obj in session.new:
+        if type(obj) in KINDS:
+            changes[(KINDS[type(obj)], obj.id)] = obj.name
+    for obj in session.dirty:
+        if type(obj) in KINDS and db.inspect(obj).attrs.name.history.has_changes():
+            changes[(KINDS[type(obj)], obj.id)] = obj.name
+    for obj in session.deleted:
+        if type(obj) in KINDS:
+            changes[(KINDS[type(obj)], obj.id)] = None
+
+
+def _apply_changes(session):
+    changes = session.info.pop('autocomplete_changes', {})
+    if not index.ready:
+        return
+    for (kind, id), name in changes.items():
+        if name is None:
+            index.remove(kind, id)
+        else:
+            index.add(kind, id, name)
+
+
+def _discard_changes(session):
+    session.info.pop('autocomplete_changes', None)
+
+
+# Keep the index in step with committed writes
+db.event.listen(db.session, 'after_flush', _collect_changes)
+db.event.listen(db.session, 'after_commit', _apply_changes)
+db.event.listen(db.session, 'after_rollback', _discard_changes)
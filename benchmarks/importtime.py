@@ -0,0 +1,70 @@
+import os
+import re
+import subprocess
+import sys
+
+#----------------------------------------------------------------------------#
+# Import-time Benchmark
+#----------------------------------------------------------------------------#
+
+# Usage:
+#   python benchmarks/importtime.py [budget_ms]
+#
+# Imports the app and builds it with `python -X importtime` in a few fresh
+# processes, prints the slowest imports of the fastest run, and exits non-zero
+# if that run takes longer than the budget. Single runs vary by a third or more
+# with disk cache and CPU contention, nearly all of it in Flask and SQLAlchemy
+# themselves, so the fastest run is the one compared.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = 450
+RUNS = 5
+TOP = 15
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(.+)')
+
+
+def measure():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, FLASK_DEBUG='1'),
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            imports.append((int(cumulative_us), int(self_us), len(indent) // 2, name.strip()))
+
+    return imports
+
+
+def total(imports):
+    # Top-level imports add up to the total cost
+    return sum(i[0] for i in imports if i[2] == 0) / 1000
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS
+    runs = [measure() for _ in range(RUNS)]
+    imports = min(runs, key=total)
+    total_ms = total(imports)
+
+    print(f'{"cumulative ms":>14} {"self ms":>8}  module')
+    for cumulative_us, self_us, depth, name in sorted(imports, reverse=True)[:TOP]:
+        print(f'{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {"  " * depth}{name}')
+    print(f'\nRuns: {", ".join(f"{total(r):.0f}" for r in runs)} ms')
+    print(f'Total import time: {total_ms:.1f} ms (budget {budget:.0f} ms)')
+
+    if total_ms > budget:
+        sys.exit('Import time is over budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+#----------------------------------------------------------------------------#
+# Memory per Request
+#----------------------------------------------------------------------------#
+
+# Usage:
+#   python benchmarks/memory.py [--shows 20000] [path ...]
+#
+# Seeds a scratch SQLite database (as benchmarks/plans.py does), then requests
+# each page in a fresh process: once to warm caches, then again under
+# tracemalloc. Reports the request's peak Python heap growth, the number of
+# heap blocks allocated by it and not yet freed at its end, and the process's
+# peak RSS. Responses are read chunk by chunk and discarded, as a server would
+# send them, so the body itself is not counted.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+PATHS = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+
+def make_app(database, seed=False):
+    import plans
+    sys.path.insert(0, ROOT)
+    os.environ['DATABASE_URL'] = database
+    os.environ.setdefault('FLASK_DEBUG', '1')
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    app.config['SQLALCHEMY_BINDS'] = {}
+    # Keep the request log quiet
+    import request_log
+    request_log.logger.disabled = True
+    if seed:
+        with app.app_context():
+            db.create_all()
+            plans.seed(db)
+
+    return app
+
+
+def fetch(client, path):
+    response = client.get(path)
+    size = 0
+    for chunk in response.iter_encoded():
+        size += len(chunk)
+    response.close()
+
+    return response.status_code, size
+
+
+def measure(database, path):
+    app = make_app(database)
+    client = app.test_client()
+    fetch(client, path)
+
+    gc.collect()
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    status, size = fetch(client, path)
+    blocks_after = sys.getallocatedblocks()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'path': path,
+        'status': status,
+        'bytes': size,
+        'peak_kb': round(peak / 1024, 1),
+        'blocks_held': blocks_after - blocks_before,
+        # ru_maxrss is in KB on Linux
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='*', default=PATHS)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--child', nargs=2, metavar=('DATABASE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return
+
+    import plans
+    plans.N_SHOWS = args.shows
+    tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database = 'sqlite:///' + tmp.name
+    try:
+        make_app(database, seed=True)
+        print(f'{"path":<16} {"status":>6} {"KB sent":>8} {"peak heap KB":>13} {"blocks held":>12} {"peak RSS KB":>12}')
+        for path in args.paths:
+            result = subprocess.run(
+                [sys.executable, __file__, '--child', database, path],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                sys.exit(result.stderr)
+            r = json.loads(result.stdout.strip().splitlines()[-1])
+            print(
+                f'{r["path"]:<16} {r["status"]:>6} {r["bytes"] / 1024:>8.0f} {r["peak_kb"]:>13} '
+                f'{r["blocks_held"]:>12} {r["peak_rss_kb"]:>12}'
+            )
+    finally:
+        os.remove(tmp.name)
+
+
+if __name__ == '__main__':
+    main()
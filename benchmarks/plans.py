@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+#----------------------------------------------------------------------------#
+# Query Plan Snapshots
+#----------------------------------------------------------------------------#
+
+# Usage:
+#   python benchmarks/plans.py record [--database URI]
+#   python benchmarks/plans.py check [--database URI] [--cost-threshold 1.5]
+#
+# Seeds a scratch database, requests every GET route, captures the SELECTs
+# they emit and runs EXPLAIN on each. `record` stores the plans under
+# benchmarks/plans/<dialect>.json, keyed by path, tables read and position
+# among that path's statements on those tables; `check` compares against that
+# snapshot and exits non-zero when a table that used to be read through a
+# bounded index lookup is now scanned in full or over an open-ended range,
+# when a query not in the snapshot reads one of the large tables that way, or
+# (on Postgres) when the estimated cost grows beyond the threshold. Run
+# `record` to accept new plans. Never point --database at a database holding
+# real data.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_DIR = os.path.join(ROOT, 'benchmarks', 'plans')
+
+N_VENUES = 500
+N_ARTISTS = 1000
+N_SHOWS = 5000
+
+# Query strings to try in addition to the bare routes
+VARIANTS = {
+    '/venues/search': ['?search_term=a', '?search_term=&genre=Jazz&state=CA'],
+    '/artists/search': ['?search_term=a', '?search_term=&genre=Jazz&seeking=yes'],
+    '/shows': ['', '?month=2021-03'],
+    '/venues/1/calendar': ['?month=2021-03'],
+    '/artists/1/calendar': ['?month=2021-03'],
+    '/autocomplete': ['?q=a'],
+}
+SKIP_ENDPOINTS = ('static', 'images.thumbnail', 'health.healthz', 'health.readyz')
+
+# Seeded with thousands of rows; reading all of one is never expected
+LARGE_TABLES = {'Venue', 'Artist', 'Show', 'ShowArchive', 'ShowListing'}
+
+#----------------------------------------------------------------------------#
+# Setup
+#----------------------------------------------------------------------------#
+
+def make_app(database):
+    sys.path.insert(0, ROOT)
+    os.environ['DATABASE_URL'] = database
+    os.environ.setdefault('FLASK_DEBUG', '1')
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    app.config['SQLALCHEMY_BINDS'] = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(db)
+
+    return app
+
+
+def seed(db):
+    from forms import genre_list, state_choices
+    from models import Venue, Artist, Show, Genre
+
+    rng = random.Random(0)
+    states = [s for s, _ in state_choices]
+    genres = [Genre(name=g) for g in genre_list]
+    db.session.add_all(genres)
+
+    for i in range(N_VENUES):
+        v = Venue(
+            name=f'Venue {i}',
+            city=f'City {i % 50}',
+            state=rng.choice(states),
+            seeking_talent=rng.random() < 0.5,
+        )
+        v.genres = rng.sample(genres, 2)
+        db.session.add(v)
+    for i in range(N_ARTISTS):
+        a = Artist(
+            name=f'Artist {i}',
+            city=f'City {i % 50}',
+            state=rng.choice(states),
+            seeking_venue=rng.random() < 0.5,
+        )
+        a.genres = rng.sample(genres, 2)
+        db.session.add(a)
+    db.session.flush()
+
+    start = datetime(2020, 1, 1)
+    db.session.bulk_insert_mappings(Show, [{
+        'venue_id': rng.randint(1, N_VENUES),
+        'artist_id': rng.randint(1, N_ARTISTS),
+        'start_time': start + timedelta(hours=rng.randint(0, 24 * 365 * 20)),
+    } for _ in range(N_SHOWS)])
+    db.session.commit()
+
+    # Bulk inserts skip the listing and popularity sync
+    from listing import rebuild_listing
+    from popularity import rebuild_popularity
+    rebuild_listing()
+    rebuild_popularity()
+
+    # Give the planner statistics
+    db.session.execute('ANALYZE')
+    db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Capture
+#----------------------------------------------------------------------------#
+
+def get_paths(app):
+    paths = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        path = re.sub(r'<(?:int:)?[^>]+>', '1', rule.rule)
+        for variant in VARIANTS.get(path, ['']):
+            paths.append(path + variant)
+
+    return paths
+
+
+def capture(app):
+    from models import db
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+
+    captured = {}
+    client = app.test_client()
+    for path in get_paths(app):
+        del statements[:]
+        # Buffer so that streamed pages run their queries here
+        client.get(path, buffered=True)
+        seen = set()
+        counts = {}
+        for statement, parameters in statements:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            # Keys survive edits to a statement's SQL, such as a new column
+            tables = '+'.join(sorted(set(re.findall(r'(?:FROM|JOIN) "?(\w+)', statement)))) or '-'
+            counts[tables] = counts.get(tables, 0) + 1
+            key = f'{path} {tables} #{counts[tables]}'
+            captured[key] = {'path': path, 'sql': statement, 'parameters': parameters}
+
+    db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return engine, captured
+
+#----------------------------------------------------------------------------#
+# Explain
+#----------------------------------------------------------------------------#
+
+def bounded(terms):
+    # An index lookup is bounded by an equality or by a range closed at both ends
+    if any(op == '=' for _, op in terms):
+        return True
+    lower = {column for column, op in terms if op.startswith('>')}
+    upper = {column for column, op in terms if op.startswith('<')}
+    return bool(lower & upper)
+
+
+def explain_sqlite(cursor, sql, parameters):
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+    lines = [row[-1] for row in cursor.fetchall()]
+
+    scans, unbounded, indexed = set(), set(), set()
+    for line in lines:
+        m = re.match(r'(SEARCH|SCAN) (?:TABLE )?(\w+)', line)
+        if not m:
+            continue
+        # "SCAN t" reads every row, "SCAN t USING INDEX i" every index entry;
+        # "SEARCH t" looks up the constraint in parentheses
+        if m.group(1) == 'SCAN':
+            (unbounded if 'INDEX' in line else scans).add(m.group(2))
+            continue
+        cond = re.search(r'\((.*)\)', line)
+        terms = re.findall(r'(\w+)(=|[<>]=?)', cond.group(1)) if cond else []
+        (indexed if bounded(terms) else unbounded).add(m.group(2))
+
+    return {
+        'plan': lines,
+        'full_scans': sorted(scans),
+        'unbounded_scans': sorted(unbounded),
+        'index_scans': sorted(indexed),
+        'cost': None,
+    }
+
+
+def explain_postgres(cursor, sql, parameters):
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+
+    lines, scans, unbounded, indexed = [], set(), set(), set()
+
+    def walk(node, depth):
+        relation = node.get('Relation Name')
+        lines.append('  ' * depth + node['Node Type'] + (f' on {relation}' if relation else ''))
+        if node['Node Type'] == 'Seq Scan':
+            scans.add(relation)
+        elif relation and ('Index' in node['Node Type'] or node['Node Type'] == 'Bitmap Heap Scan'):
+            # Bitmap heap scans repeat their index's condition as the recheck
+            cond = node.get('Index Cond') or node.get('Recheck Cond') or ''
+            terms = re.findall(r'(\w+)\W* (=|[<>]=?) ', cond)
+            (indexed if bounded(terms) else unbounded).add(relation)
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+
+    return {
+        'plan': lines,
+        'full_scans': sorted(scans),
+        'unbounded_scans': sorted(unbounded),
+        'index_scans': sorted(indexed),
+        'cost': root['Total Cost'],
+    }
+
+
+def explain_all(engine, captured):
+    explain = explain_postgres if engine.dialect.name == 'postgresql' else explain_sqlite
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        plans = {}
+        for key, q in sorted(captured.items(), key=lambda kv: (kv[1]['path'], kv[0])):
+            plans[key] = dict(
+                {'path': q['path'], 'sql': q['sql']},
+                **explain(cursor, q['sql'], q['parameters']),
+            )
+    finally:
+        raw.close()
+
+    return plans
+
+#----------------------------------------------------------------------------#
+# Compare
+#----------------------------------------------------------------------------#
+
+def compare(old, new, cost_threshold):
+    problems = []
+    for key, plan in new.items():
+        scanned = set(plan['full_scans']) | set(plan['unbounded_scans'])
+        before = old.get(key)
+        if before is None:
+            large = scanned & LARGE_TABLES
+            if large:
+                problems.append(
+                    f"{key}: new query scans {', '.join(sorted(large))} "
+                    f"without a bounded index lookup\n    {plan['sql'][:200]}"
+                )
+            continue
+        regressed = scanned & set(before['index_scans']) - set(plan['index_scans'])
+        if regressed:
+            problems.append(
+                f"{key}: now scans {', '.join(sorted(regressed))} "
+                f"instead of a bounded index lookup\n    {plan['sql'][:200]}"
+            )
+        if before['cost'] and plan['cost'] and plan['cost'] > before['cost'] * cost_threshold:
+            problems.append(
+                f"{key}: estimated cost {before['cost']:.1f} -> {plan['cost']:.1f}"
+            )
+    new_keys = set(new) - set(old)
+
+    return problems, new_keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record or check query plan snapshots.')
+    parser.add_argument('command', choices=('record', 'check'))
+    parser.add_argument('--database', default=None,
+                        help='Scratch database URI (default: a temporary SQLite file)')
+    parser.add_argument('--cost-threshold', type=float, default=1.5,
+                        help='Fail when estimated cost grows by more than this factor')
+    args = parser.parse_args()
+
+    tmp = None
+    database = args.database
+    if not database:
+        tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        database = 'sqlite:///' + tmp.name
+
+    try:
+        app = make_app(database)
+        engine, captured = capture(app)
+        plans = explain_all(engine, captured)
+    finally:
+        if tmp:
+            os.remove(tmp.name)
+
+    snapshot = os.path.join(SNAPSHOT_DIR, engine.dialect.name + '.json')
+    if args.command == 'record':
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(snapshot, 'w') as f:
+            json.dump(plans, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Recorded {len(plans)} query plans to {os.path.relpath(snapshot, ROOT)}')
+        return
+
+    with open(snapshot) as f:
+        old = json.load(f)
+    problems, new_keys = compare(old, plans, args.cost_threshold)
+    print(f'Checked {len(plans)} query plans ({len(new_keys)} not in snapshot)')
+    for p in problems:
+        print('REGRESSION ' + p)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
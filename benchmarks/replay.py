@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+#----------------------------------------------------------------------------#
+# Traffic Replay
+#----------------------------------------------------------------------------#
+
+# Usage:
+#   python benchmarks/replay.py access.jsonl --target http://localhost:8000 \
+#       --concurrency 16 --rate 200
+#   python benchmarks/replay.py access.jsonl --target app --concurrency 4
+#
+# Replays requests recorded with ACCESS_LOG_PATH against a running server, or
+# against the Flask test client with `--target app`, and reports throughput,
+# latency percentiles and error rates.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_log(path, limit=None):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+            if limit and len(entries) >= limit:
+                break
+
+    return entries
+
+#----------------------------------------------------------------------------#
+# Senders
+#----------------------------------------------------------------------------#
+
+class HTTPSender:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def send(self, entry):
+        data = None
+        if entry['form']:
+            data = urllib.parse.urlencode(entry['form'], doseq=True).encode()
+        req = urllib.request.Request(
+            self.base_url + entry['path'],
+            data=data,
+            method=entry['method'],
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class AppSender:
+    def __init__(self):
+        sys.path.insert(0, ROOT)
+        from app import create_app
+        self.app = create_app()
+        self.local = threading.local()
+
+    def send(self, entry):
+        # One test client per thread
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        # Buffered, so streamed pages are rendered (and their queries run)
+        # before the clock stops, as a server would send them in full
+        response = self.local.client.open(
+            entry['path'],
+            method=entry['method'],
+            data=entry['form'] or None,
+            buffered=True,
+        )
+
+        return response.status_code
+
+#----------------------------------------------------------------------------#
+# Replay
+#----------------------------------------------------------------------------#
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    i = min(int(round(p / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[i]
+
+
+def replay(entries, sender, concurrency, rate):
+    results = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run(i, entry):
+        # Open-loop pacing: request i is due at i / rate seconds, and its
+        # latency counts from then, so time spent queued behind slow requests
+        # for a free worker is included rather than hidden
+        t0 = time.perf_counter()
+        if rate:
+            t0 = start + i / rate
+            delay = t0 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            status = sender.send(entry)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - t0
+        with lock:
+            results.append((status, elapsed))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, entry in enumerate(entries):
+            pool.submit(run, i, entry)
+
+    return results, time.perf_counter() - start
+
+
+def report(results, wall_time):
+    latencies = sorted(r[1] * 1000 for r in results)
+    n = len(results)
+    failed = sum(1 for s, _ in results if s is None)
+    server_errors = sum(1 for s, _ in results if s is not None and s >= 500)
+    client_errors = sum(1 for s, _ in results if s is not None and 400 <= s < 500)
+
+    print(f'Requests:       {n}')
+    print(f'Wall time:      {wall_time:.2f} s')
+    print(f'Throughput:     {n / wall_time if wall_time else 0:.1f} req/s')
+    print('Latency (ms):   ' + '  '.join(
+        f'p{p}={percentile(latencies, p):.1f}' for p in (50, 90, 95, 99)
+    ) + f'  max={latencies[-1] if latencies else 0:.1f}')
+    print(f'Errors:         {failed + server_errors} ({(failed + server_errors) / n * 100 if n else 0:.2f}%)'
+          f' [{failed} failed, {server_errors} 5xx]')
+    print(f'Client errors:  {client_errors} 4xx')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded access log.')
+    parser.add_argument('log', help='JSONL file written via ACCESS_LOG_PATH')
+    parser.add_argument('--target', default='app',
+                        help="Base URL of a running server, or 'app' for the Flask test client")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Requests per second to send (0 sends as fast as possible)')
+    parser.add_argument('--limit', type=int, default=None, help='Replay at most this many requests')
+    parser.add_argument('--repeat', type=int, default=1, help='Replay the log this many times')
+    parser.add_argument('--methods', default='GET',
+                        help="Comma-separated methods to replay, e.g. 'GET,POST' (default GET only)")
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    methods = {m.strip().upper() for m in args.methods.split(',')}
+    entries = [e for e in load_log(args.log, args.limit) if e['method'] in methods] * args.repeat
+    if not entries:
+        sys.exit('Nothing to replay')
+
+    if args.target == 'app':
+        sender = AppSender()
+    else:
+        sender = HTTPSender(args.target, args.timeout)
+
+    results, wall_time = replay(entries, sender, args.concurrency, args.rate)
+    report(results, wall_time)
+
+
+if __name__ == '__main__':
+    main()
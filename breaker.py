@@ -0,0 +1,326 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import abort, current_app, g, request, session, Response
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Circuit Breaker
+#----------------------------------------------------------------------------#
+
+class CircuitBreaker:
+    # closed: requests use the database; open: they don't; half_open: one
+    # trial request may, and its first statement decides the next state
+    def __init__(self, failures=5, window=10, slow_ms=2000, reset=15):
+        self.lock = threading.Lock()
+        self.configure(failures, window, slow_ms, reset)
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.trial_at = 0.0
+        self.recent = deque()
+        self.inflight = {}
+
+    def configure(self, failures, window, slow_ms, reset):
+        self.failures = failures
+        self.window = window
+        self.slow = slow_ms / 1000
+        self.reset = reset
+
+    def _open(self, now):
+        self.state = 'open'
+        self.opened_at = now
+        self.recent.clear()
+
+    def failure(self, now=None):
+        now = now or time.monotonic()
+        with self.lock:
+            if self.state == 'half_open':
+                self._open(now)
+                return
+            self.recent.append(now)
+            while self.recent and self.recent[0] < now - self.window:
+                self.recent.popleft()
+            if self.state == 'closed' and len(self.recent) >= self.failures:
+                self._open(now)
+
+    def success(self):
+        with self.lock:
+            if self.state == 'half_open':
+                self.state = 'closed'
+
+    def started(self, key, now):
+        with self.lock:
+            self.inflight[key] = now
+
+    def finished(self, key, now):
+        with self.lock:
+            start = self.inflight.pop(key, None)
+        if start is None:
+            return
+        # Slow statements count as failures
+        if now - start >= self.slow:
+            self.failure(now)
+        else:
+            self.success()
+
+    def discard(self, key):
+        with self.lock:
+            self.inflight.pop(key, None)
+
+    def closed(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.state == 'closed':
+                # Statements hung on the database never finish, so count them now
+                stalled = sum(1 for start in self.inflight.values() if now - start >= self.slow)
+                if stalled >= self.failures:
+                    self._open(now)
+            return self.state == 'closed'
+
+    def try_trial(self):
+        # Let one request through once the breaker has been open long enough
+        now = time.monotonic()
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and now - self.opened_at >= self.reset:
+                self.state = 'half_open'
+                self.trial_at = now
+                return True
+            if self.state == 'half_open' and now - self.trial_at >= self.reset:
+                # The previous trial never reached the database
+                self.trial_at = now
+                return True
+            return False
+
+    def retry_after(self):
+        with self.lock:
+            return max(1, int(self.reset - (time.monotonic() - self.opened_at)))
+
+
+breaker = CircuitBreaker()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    breaker.started(id(context), time.monotonic())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    breaker.finished(id(context), time.monotonic())
+
+
+def _handle_error(context):
+    if context.execution_context is not None:
+        breaker.discard(id(context.execution_context))
+    # Lost connections and timeouts, not constraint violations
+    if context.is_disconnect or isinstance(context.sqlalchemy_exception, (exc.OperationalError, exc.InterfaceError)):
+        breaker.failure()
+
+#----------------------------------------------------------------------------#
+# Page Cache
+#----------------------------------------------------------------------------#
+
+class PageCache:
+    # Last good copy of each read-only page, least recently used evicted first
+    def __init__(self, max_bytes, max_entry_bytes, refresh):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.refresh = refresh
+        self.size = 0
+        self.pages = OrderedDict()
+        # Pages found too large to keep, and when
+        self.too_large = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+            return page
+
+    def wants(self, key):
+        # Copies are only refreshed every so often, so most requests skip this
+        with self.lock:
+            page = self.pages.get(key)
+            stored_at = page[2] if page is not None else self.too_large.get(key, 0)
+        return time.time() - stored_at >= self.refresh
+
+    def skip(self, key):
+        with self.lock:
+            self.too_large.pop(key, None)
+            self.too_large[key] = time.time()
+            while len(self.too_large) > 1000:
+                self.too_large.popitem(last=False)
+
+    def put(self, key, body, content_type):
+        if len(body) > self.max_entry_bytes:
+            self.skip(key)
+            return
+        with self.lock:
+            old = self.pages.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self.pages[key] = (body, content_type, time.time())
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (old_body, _, _) = self.pages.popitem(last=False)
+                self.size -= len(old_body)
+
+
+pages = PageCache(50 * 1024 * 1024, 1024 * 1024, 60)
+
+# Never cached, and served even while the breaker is open: they either
+# don't use the database or aren't worth keeping (cursor-paged feeds, probes)
+SKIP_ENDPOINTS = (
+    'static',
+    'images.thumbnail',
+    'main.autocomplete',
+    'api.changes',
+    'health.healthz',
+    'health.readyz',
+)
+
+
+def cacheable(response):
+    return (
+        request.method == 'GET'
+        and g.get('read_only')
+        and not g.get('page_stale')
+        and not g.get('had_flashes')
+        and response.status_code == 200
+        and request.endpoint not in SKIP_ENDPOINTS
+    )
+
+
+def store_page(response):
+    if not cacheable(response):
+        return response
+
+    key = request.full_path.rstrip('?')
+    if not request.environ.get(REVALIDATE_KEY) and not pages.wants(key):
+        return response
+    content_type = response.headers.get('Content-Type')
+    if not response.is_streamed:
+        pages.put(key, response.get_data(), content_type)
+        return response
+
+    # Copy streamed pages as the chunks go out, giving up once the copy
+    # outgrows an entry so that large lists keep streaming in constant memory
+    chunks = response.response
+
+    def capture():
+        body = []
+        size = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode(response.charset)
+                if body is not None:
+                    size += len(chunk)
+                    if size <= pages.max_entry_bytes:
+                        body.append(chunk)
+                    else:
+                        body = None
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+        if body is not None:
+            pages.put(key, b''.join(body), content_type)
+        else:
+            pages.skip(key)
+
+    response.response = capture()
+    return response
+
+#----------------------------------------------------------------------------#
+# Revalidation
+#----------------------------------------------------------------------------#
+
+# Refreshes a stale page by requesting it again in the background, as the
+# breaker's trial request once it may close. Marked in the WSGI environ,
+# which clients can't set, rather than by a header
+REVALIDATE_KEY = 'fyyur.revalidate'
+revalidator = ThreadPoolExecutor(max_workers=1, thread_name_prefix='revalidate')
+pending = set()
+pending_lock = threading.Lock()
+
+
+def _revalidate(app, key):
+    try:
+        app.test_client().get(key, environ_overrides={REVALIDATE_KEY: True}, buffered=True)
+    except Exception:
+        app.logger.exception('Revalidation failed')
+    finally:
+        with pending_lock:
+            pending.discard(key)
+
+
+def revalidate(key):
+    with pending_lock:
+        if key in pending:
+            return
+        pending.add(key)
+    revalidator.submit(_revalidate, current_app._get_current_object(), key)
+
+#----------------------------------------------------------------------------#
+# Request Hooks
+#----------------------------------------------------------------------------#
+
+def stale_response(page):
+    body, content_type, stored_at = page
+    response = Response(body, content_type=content_type)
+    response.headers['X-Cache'] = 'STALE'
+    response.headers['Age'] = str(int(time.time() - stored_at))
+    response.headers['Warning'] = '110 - "Response is Stale"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def guard_request():
+    g.had_flashes = '_flashes' in session
+    if request.endpoint in SKIP_ENDPOINTS or breaker.closed():
+        return None
+
+    # Read pages: last good copy now, fresh one in the background
+    revalidating = request.environ.get(REVALIDATE_KEY, False)
+    if request.method in ('GET', 'HEAD') and not revalidating:
+        key = request.full_path.rstrip('?')
+        page = pages.get(key)
+        if page is not None:
+            g.page_stale = True
+            revalidate(key)
+            return stale_response(page)
+
+    # Writes fail fast; reads without a copy may be the trial request
+    if request.method in ('GET', 'HEAD') and breaker.try_trial():
+        return None
+    abort(503)
+
+
+def init_app(app):
+    if not app.config.get('BREAKER_ENABLED', True):
+        return
+
+    breaker.configure(
+        app.config.get('BREAKER_FAILURES', 5),
+        app.config.get('BREAKER_WINDOW', 10),
+        app.config.get('BREAKER_SLOW_MS', 2000),
+        app.config.get('BREAKER_RESET_SECONDS', 15),
+    )
+    pages.max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+    pages.max_entry_bytes = app.config.get('PAGE_CACHE_MAX_ENTRY_BYTES', 1024 * 1024)
+    pages.refresh = app.config.get('PAGE_CACHE_REFRESH_SECONDS', 60)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    app.before_request(guard_request)
+    app.after_request(store_page)
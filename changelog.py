@@ -0,0 +1,143 @@
+import json
+import threading
+from datetime import timedelta
+
+from flask import current_app
+
+from models import db, Venue, Artist, Show, ShowArchive, ChangeLog
+from helpers import time_now
+
+#----------------------------------------------------------------------------#
+# Change Log
+#----------------------------------------------------------------------------#
+
+ENTITIES = {Venue: 'venue', Artist: 'artist', Show: 'show'}
+
+# Archived shows keep their ids, so bulk writes to them log as shows
+BULK_ENTITIES = {**ENTITIES, ShowArchive: 'show'}
+
+changes = ChangeLog.__table__
+
+
+def log_time():
+    # ts is a naive UTC column
+    return time_now().replace(tzinfo=None)
+
+
+def _encode(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _entry(ts, obj, op):
+    data = None if op == 'delete' else json.dumps(obj.to_dict(), default=_encode)
+    return {
+        'ts': ts,
+        'entity': BULK_ENTITIES[type(obj)],
+        'entity_id': obj.id,
+        'op': op,
+        'data': data,
+    }
+
+
+def _collect_changes(session, flush_context):
+    # One entry per object per transaction, however many flushes it takes
+    pending = session.info.setdefault('changelog', {})
+    for obj in session.new:
+        if type(obj) in ENTITIES:
+            pending[(type(obj), obj.id)] = ('create', obj)
+    for obj in session.dirty:
+        if type(obj) in ENTITIES and session.is_modified(obj):
+            op, _ = pending.get((type(obj), obj.id), ('update', None))
+            pending[(type(obj), obj.id)] = (op, obj)
+    for obj in session.deleted:
+        if type(obj) in ENTITIES:
+            pending[(type(obj), obj.id)] = ('delete', obj)
+
+
+def _write_changes(session):
+    # Written just before commit, in the same transaction as the changes;
+    # flush first since commit only flushes after this hook runs
+    session.flush()
+    pending = session.info.pop('changelog', None)
+    if not pending:
+        return
+    ts = log_time()
+    session.execute(changes.insert(), [_entry(ts, obj, op) for op, obj in pending.values()])
+
+
+def _discard_changes(session):
+    session.info.pop('changelog', None)
+
+
+def record_bulk(session, model, ids, op):
+    # For set-based writes that bypass the session's change tracking
+    if not ids:
+        return
+    ts = log_time()
+    if op == 'delete':
+        entries = [
+            {'ts': ts, 'entity': BULK_ENTITIES[model], 'entity_id': id, 'op': op, 'data': None}
+            for id in ids
+        ]
+    else:
+        query = session.query(model).filter(model.id.in_(ids)).populate_existing()
+        if model in (Venue, Artist):
+            query = query.options(db.selectinload('genres'))
+        entries = [_entry(ts, obj, op) for obj in query]
+    session.execute(changes.insert(), entries)
+
+
+db.event.listen(db.session, 'after_flush', _collect_changes)
+db.event.listen(db.session, 'before_commit', _write_changes)
+db.event.listen(db.session, 'after_rollback', _discard_changes)
+
+#----------------------------------------------------------------------------#
+# Reading
+#----------------------------------------------------------------------------#
+
+def changes_since(since, limit, settle):
+    # Ids are assigned before commit, so a slow transaction can commit a lower
+    # id after a higher one was read; holding back the newest entries for a
+    # few seconds keeps cursors from skipping them
+    query = ChangeLog.query.filter(
+        ChangeLog.id > since,
+        ChangeLog.ts <= log_time() - settle,
+    ).order_by(ChangeLog.id).limit(limit)
+
+    return query.yield_per(500)
+
+
+def settle_time():
+    return timedelta(seconds=current_app.config.get('CHANGES_SETTLE_SECONDS', 2))
+
+
+class Follower:
+    # Keeps a per-process cache in step with writes committed by any worker,
+    # by applying the entries past a cursor in id order; `apply` gets each
+    # batch and must be idempotent, since entries may be applied twice
+    def __init__(self, apply, batch=1000):
+        self.apply = apply
+        self.batch = batch
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def reset(self, settle):
+        # Call before loading the cache from the tables; entries that may not
+        # have committed yet stay past the cursor
+        cursor = db.session.query(ChangeLog.id).filter(
+            ChangeLog.ts <= log_time() - settle,
+        ).order_by(ChangeLog.id.desc()).limit(1).scalar()
+        with self.lock:
+            self.cursor = cursor or 0
+
+    def catch_up(self, settle):
+        with self.lock:
+            applied = 0
+            while True:
+                batch = changes_since(self.cursor, self.batch, settle).all()
+                if batch:
+                    self.apply(batch)
+                    self.cursor = batch[-1].id
+                applied += len(batch)
+                if len(batch) < self.batch:
+                    return applied
@@ -3,11 +3,11 @@ import os
 # Get path to current script
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Set a secret key
-SECRET_KEY = os.urandom(32)
+# Set a secret key (shared by all workers when set in the environment)
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 
 # Enable debug mode
-DEBUG = True
+DEBUG = os.environ.get('FLASK_DEBUG', '1') == '1'
 
 # Specify database connection details
 dialect = 'postgres'
@@ -16,5 +16,82 @@ password = '' # No password
 host = 'localhost'
 port = '5432'
 db_name = "fyyur"
-SQLALCHEMY_DATABASE_URI = f'{dialect}://{username}:{password}@{host}:{port}/{db_name}'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL',
+    f'{dialect}://{username}:{password}@{host}:{port}/{db_name}',
+)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Specify read replicas, e.g. REPLICA_DATABASE_URIS="postgres://...,postgres://..."
+replica_uris = [u for u in os.environ.get('REPLICA_DATABASE_URIS', '').split(',') if u]
+SQLALCHEMY_BINDS = {f'replica_{i}': uri for i, uri in enumerate(replica_uris)}
+REPLICA_STRATEGY = 'round_robin' # Or 'least_connections'
+REPLICA_MAX_LAG = 5 # Seconds behind primary before a replica is skipped
+REPLICA_LAG_CHECK_INTERVAL = 5 # Seconds between lag checks per replica
+READ_YOUR_WRITES_WINDOW = 5 # Seconds a client reads from primary after writing
+
+# Circuit breaker: open after BREAKER_FAILURES database errors or slow statements
+# within BREAKER_WINDOW seconds, then serve read pages from their last good copy
+# (and fail writes with 503) until a trial request succeeds
+BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', '1') == '1'
+BREAKER_FAILURES = 5
+BREAKER_WINDOW = 10 # Seconds
+BREAKER_SLOW_MS = 2000 # Statements slower than this count as failures
+BREAKER_RESET_SECONDS = 15 # Seconds open before a trial request is let through
+PAGE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+PAGE_CACHE_MAX_ENTRY_BYTES = 1024 * 1024 # Larger pages are not kept, so they stream in constant memory
+PAGE_CACHE_REFRESH_SECONDS = 60 # Seconds before a kept copy is replaced by a newer rendering
+
+# Background jobs (see jobs.py) run on a thread pool in each gunicorn worker;
+# Postgres advisory locks elect the one worker that runs each leader job
+JOBS_ENABLED = os.environ.get('JOBS_ENABLED', '0') == '1'
+JOBS_THREADS = 2
+
+# Bearer token for operator endpoints such as /api/jobs; unset hides them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Seconds /readyz waits for the database before reporting the worker unavailable
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT', 2))
+
+# Record every request as a JSON line for benchmarks/replay.py (off when unset)
+ACCESS_LOG_PATH = os.environ.get('ACCESS_LOG_PATH')
+
+# Structured request log: one JSON line per request with timing and SQL counts,
+# written to stderr unless a path is given
+REQUEST_LOG_PATH = os.environ.get('REQUEST_LOG_PATH')
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500)) # Requests slower than this are logged as warnings
+
+# Profile a sample of requests with cProfile and keep the profiles of slow ones
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.05)) # 0 disables profiling
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(basedir, 'instance', 'profiles'))
+PROFILE_KEEP = 100 # Newest profiles kept in PROFILE_DIR
+
+# Image proxy: thumbnails are cached on disk and evicted least recently used first
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(basedir, 'instance', 'image_cache'))
+IMAGE_CACHE_MAX_BYTES = 100 * 1024 * 1024
+IMAGE_WIDTHS = (200, 400, 800)
+IMAGE_FETCH_TIMEOUT = 5 # Seconds
+IMAGE_FETCHER = None # Callable taking a URL and returning image bytes; None uses urllib
+
+# Stream /venues, /artists and /shows to the client as they render, fetching
+# rows lazily; the buffer size is the number of template chunks per write
+STREAM_TEMPLATES = True
+STREAM_BUFFER_SIZE = 20
+
+# Compare show times against the database clock (now()) rather than a
+# timestamp bound from Python when splitting past/upcoming shows
+SHOW_CUTOFF_IN_DB = False
+
+# Shows that started more than this many days ago are moved to ShowArchive
+# by `flask archive-shows`
+SHOW_RETENTION_DAYS = 365
+
+# Change feed at /api/changes: entries younger than the settle time are held
+# back so that a slow transaction cannot commit behind a client's cursor
+CHANGES_SETTLE_SECONDS = 2
+CHANGES_MAX_LIMIT = 10000
+
+# Search result paging; above the threshold, totals use the planner's estimate
+SEARCH_PER_PAGE = 20
+SEARCH_MAX_PER_PAGE = 100
+SEARCH_EXACT_COUNT_THRESHOLD = 1000
@@ -0,0 +1,162 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Blocking Keys
+#----------------------------------------------------------------------------#
+
+# Words that rarely tell two names apart
+STOPWORDS = {'the', 'a', 'an', 'and', 'n', 'of', 'at'}
+
+SOUNDEX_CODES = {}
+for letters, code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for letter in letters:
+        SOUNDEX_CODES[letter] = code
+
+
+def normalize(text):
+    # Lowercase ASCII words without accents or punctuation
+    text = unicodedata.normalize('NFKD', text or '')
+    text = text.encode('ascii', 'ignore').decode().casefold().replace('&', ' and ')
+    return re.sub(r'[^a-z0-9]+', ' ', text).split()
+
+
+def soundex(word):
+    if not word.isalpha():
+        return word
+    code = word[0].upper()
+    last = SOUNDEX_CODES.get(word[0], '')
+    for letter in word[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != last:
+            code += digit
+        # h and w do not separate letters with the same code
+        if letter not in 'hw':
+            last = digit
+    return (code + '000')[:4]
+
+
+def name_words(name):
+    return sorted(w for w in normalize(name) if w not in STOPWORDS) or normalize(name)
+
+
+def blocking_keys(name, city, state):
+    # Records sharing either key are compared; others never are
+    words = name_words(name)
+    place = ' '.join(normalize(city)) + '|' + (state or '')
+    name_key = ' '.join(words) + '|' + place
+    phonetic_key = ' '.join(soundex(w) for w in words) + '|' + (state or '')
+
+    return name_key, phonetic_key
+
+
+def similarity(a, b):
+    return SequenceMatcher(None, ' '.join(name_words(a)), ' '.join(name_words(b))).ratio()
+
+
+def _set_keys(mapper, connection, target):
+    target.name_key, target.phonetic_key = blocking_keys(target.name, target.city, target.state)
+
+
+for model in (Venue, Artist):
+    db.event.listen(model, 'before_insert', _set_keys)
+    db.event.listen(model, 'before_update', _set_keys)
+
+#----------------------------------------------------------------------------#
+# Lookup
+#----------------------------------------------------------------------------#
+
+# Names at least this similar (0-1) within a block count as likely duplicates
+MIN_SIMILARITY = 0.8
+
+
+def find_duplicates(model, name, city, state, exclude_id=None):
+    # Indexed lookups on the two keys, then a fuzzy check of the few candidates
+    name_key, phonetic_key = blocking_keys(name, city, state)
+    query = db.session.query(model.id, model.name, model.city, model.state, model.name_key).filter(
+        db.or_(model.name_key == name_key, model.phonetic_key == phonetic_key),
+    )
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+
+    # Don't flush a record that is still being built, or it would match itself
+    with db.session.no_autoflush:
+        candidates = query.limit(50).all()
+
+    return [
+        r for r in candidates
+        if r.name_key == name_key or similarity(name, r.name) >= MIN_SIMILARITY
+    ]
+
+#----------------------------------------------------------------------------#
+# Batch
+#----------------------------------------------------------------------------#
+
+def fill_missing_keys(model):
+    # Rows written before the key columns existed
+    rows = db.session.query(model.id, model.name, model.city, model.state).filter(
+        model.name_key == None,
+    ).all()
+    if rows:
+        table = model.__table__
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('row_id')).values(
+                name_key=db.bindparam('nk'),
+                phonetic_key=db.bindparam('pk'),
+            ),
+            [
+                dict(zip(('row_id', 'nk', 'pk'), (r.id,) + blocking_keys(r.name, r.city, r.state)))
+                for r in rows
+            ],
+        )
+        db.session.commit()
+
+    return len(rows)
+
+
+# Blocks larger than this come from keys too generic to be useful
+MAX_BLOCK = 200
+
+
+def duplicate_clusters(model):
+    # Only records that share a key with another are loaded and compared
+    blocks = []
+    for key in (model.name_key, model.phonetic_key):
+        shared = db.session.query(key.label('key')).group_by(key).having(db.func.count() > 1).subquery()
+        rows = db.session.query(model.id, model.name, key.label('key')).filter(
+            key.in_(db.select([shared.c.key])),
+        ).order_by(key, model.id)
+        block = {}
+        for r in rows:
+            block.setdefault(r.key, []).append(r)
+        blocks.extend(b for b in block.values() if len(b) <= MAX_BLOCK)
+
+    # Union-find over similar pairs within each block
+    parent = {}
+    names = {}
+
+    def find(id):
+        while parent.setdefault(id, id) != id:
+            parent[id] = parent[parent[id]]
+            id = parent[id]
+        return id
+
+    for block in blocks:
+        for i, a in enumerate(block):
+            names[a.id] = a.name
+            for b in block[i + 1:]:
+                if similarity(a.name, b.name) >= MIN_SIMILARITY:
+                    parent[find(b.id)] = find(a.id)
+
+    clusters = {}
+    for id in parent:
+        clusters.setdefault(find(id), []).append(id)
+
+    return [
+        [(id, names[id]) for id in sorted(ids)]
+        for ids in sorted(clusters.values(), key=min)
+        if len(ids) > 1
+    ]
@@ -7,6 +7,7 @@ from wtforms import (
     SelectMultipleField,
     DateTimeField,
     BooleanField,
+    HiddenField,
 )
 from wtforms.validators import DataRequired, AnyOf, URL
 
@@ -147,6 +148,9 @@ class VenueForm(Form):
     seeking_description = StringField(
         'seeking_description',
     )
+    version = HiddenField(
+        'version',
+    )
 
 class ArtistForm(Form):
     name = StringField(
@@ -187,3 +191,6 @@ class ArtistForm(Form):
     seeking_description = StringField(
         'seeking_description',
     )
+    version = HiddenField(
+        'version',
+    )
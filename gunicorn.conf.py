@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+
+#----------------------------------------------------------------------------#
+# Server Config
+#----------------------------------------------------------------------------#
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 1))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+
+# Import the app once in the master so workers fork with code already loaded
+preload_app = True
+
+#----------------------------------------------------------------------------#
+# Hooks
+#----------------------------------------------------------------------------#
+
+def post_fork(server, worker):
+    from warmup import reset_engines
+    from wsgi import app
+    reset_engines(app)
+
+
+def post_worker_init(worker):
+    # Runs before the worker accepts any traffic. An exception here would be a
+    # boot error, which stops the whole server, so a worker that can't warm
+    # up keeps running and reports not ready on /readyz until it can
+    from warmup import warm_up, status
+    from jobs import start_scheduler
+    from wsgi import app
+    try:
+        warm = warm_up(app, connections=threads)
+    except Exception as e:
+        worker.log.exception('Worker %s failed to warm up', worker.pid)
+        # Lets the next readiness probe retry
+        status.update(state='failed', error=str(e))
+        warm = False
+    if warm:
+        worker.log.info('Worker %s warmed up', worker.pid)
+    else:
+        worker.log.warning('Worker %s is not warm; /readyz reports 503 until a retry succeeds', worker.pid)
+    if start_scheduler(app):
+        worker.log.info('Worker %s started the job scheduler', worker.pid)
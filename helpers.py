@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app, render_template, stream_with_context, url_for, abort, Response
+
+from models import Genre
+from search import FACETS
+
+#----------------------------------------------------------------------------#
+# Filters
+#----------------------------------------------------------------------------#
+
+def format_datetime(value, format='medium'):
+  # Imported on first use to keep app startup fast
+  import babel.dates
+  # Query rows carry datetimes; only strings need parsing
+  if isinstance(value, datetime):
+      date = value
+  else:
+      import dateutil.parser
+      date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE, MMMM d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE, MM/dd/y, h:mma"
+  return babel.dates.format_datetime(date, format)
+
+#----------------------------------------------------------------------------#
+# Rendering
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+    # Send the page as it renders, so lazy row iterators are consumed while
+    # the response is being written rather than before it starts
+    app = current_app._get_current_object()
+    if not app.config.get('STREAM_TEMPLATES', True):
+        return render_template(template_name, **context)
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config.get('STREAM_BUFFER_SIZE', 20))
+
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+#----------------------------------------------------------------------------#
+# Helpers
+#----------------------------------------------------------------------------#
+
+def time_now():
+    return datetime.now(timezone.utc)
+
+def get_genre(name):
+    g = Genre.query.filter(Genre.name == name).first()
+    if not g:
+        g = Genre(name=name)
+
+    return g
+
+def apply_changes(obj, values):
+    # Only assign columns whose value actually changed ('' and None are equal)
+    changed = []
+    for key, value in values.items():
+        current = getattr(obj, key)
+        if current != value and not (current in (None, '') and value in (None, '')):
+            setattr(obj, key, value)
+            changed.append(key)
+
+    return changed
+
+def sync_genres(obj, names):
+    # Only add/remove the genre links that differ
+    current = {g.name: g for g in obj.genres}
+    wanted = set(names)
+    for name in set(current) - wanted:
+        obj.genres.remove(current[name])
+    for name in sorted(wanted - set(current)):
+        obj.genres.append(get_genre(name=name))
+
+    return set(current) != wanted
+
+def package_facets(endpoint, search_term, filters, counts):
+    facets = {}
+    for f in FACETS:
+        facets[f] = []
+        for value, n in counts[f]:
+            # Link to the same search with this facet value toggled
+            toggled = dict(filters)
+            if f == 'genre':
+                active = value in filters['genre']
+                toggled['genre'] = [g for g in filters['genre'] if g != value]
+                if not active:
+                    toggled['genre'].append(value)
+            else:
+                active = filters[f] == value
+                toggled[f] = None if active else value
+            facets[f].append({
+                'value': value,
+                'count': n,
+                'active': active,
+                'url': url_for(endpoint, search_term=search_term, **toggled),
+            })
+
+    return facets
+
+def package_pages(endpoint, search_term, filters, page, per_page, total):
+    n_pages = max((total + per_page - 1) // per_page, 1)
+
+    def page_url(p):
+        return url_for(endpoint, search_term=search_term, page=p, per_page=per_page, **filters)
+
+    return {
+        'page': page,
+        'n_pages': n_pages,
+        'prev_url': page_url(page - 1) if page > 1 else None,
+        'next_url': page_url(page + 1) if page < n_pages else None,
+    }
+
+def get_time_range(values):
+    # Half-open [start, end) range from ?month=, ?week= or ?from=&to=
+    try:
+        if values.get('month'):
+            start = datetime.strptime(values['month'], '%Y-%m')
+            end = (start + timedelta(days=32)).replace(day=1)
+        elif values.get('week'):
+            start = datetime.strptime(values['week'] + '-1', '%G-W%V-%u')
+            end = start + timedelta(weeks=1)
+        elif values.get('from') or values.get('to'):
+            start = datetime.fromisoformat(values['from']) if values.get('from') else datetime.min
+            end = datetime.fromisoformat(values['to']) if values.get('to') else datetime.max
+        else:
+            return None
+    except ValueError:
+        abort(400)
+    if start >= end:
+        abort(400)
+
+    return start, end
@@ -0,0 +1,190 @@
+import hashlib
+import hmac
+import importlib.util
+import io
+import os
+import threading
+import urllib.request
+from urllib.parse import urlparse
+
+from flask import current_app, url_for
+
+#----------------------------------------------------------------------------#
+# Fetching
+#----------------------------------------------------------------------------#
+
+class FetchError(Exception):
+    pass
+
+
+def fetch_url(url):
+    # Default fetcher; swap in another callable via IMAGE_FETCHER
+    timeout = current_app.config.get('IMAGE_FETCH_TIMEOUT', 5)
+    max_bytes = current_app.config.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+    req = urllib.request.Request(url, headers={'User-Agent': 'Fyyur image proxy'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+    except Exception as e:
+        raise FetchError(str(e))
+    if len(data) > max_bytes:
+        raise FetchError('Image is too large')
+
+    return data
+
+
+def get_fetcher():
+    return current_app.config.get('IMAGE_FETCHER') or fetch_url
+
+#----------------------------------------------------------------------------#
+# Signing
+#----------------------------------------------------------------------------#
+
+def sign(url):
+    key = current_app.config['SECRET_KEY']
+    if isinstance(key, str):
+        key = key.encode()
+    return hmac.new(key, url.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def verify(url, signature):
+    return hmac.compare_digest(sign(url), signature or '')
+
+
+def thumbnail_url(url, width=400):
+    # Jinja filter: proxied, resized URL for an external image link
+    if not url or urlparse(url).scheme not in ('http', 'https'):
+        return url
+    return url_for('images.thumbnail', width=width, url=url, sig=sign(url))
+
+#----------------------------------------------------------------------------#
+# Resizing
+#----------------------------------------------------------------------------#
+
+# (offset, magic bytes) pairs; WAV and AVI files are RIFF containers too
+TYPES = (
+    (((0, b'\xff\xd8'),), 'image/jpeg'),
+    (((0, b'\x89PNG'),), 'image/png'),
+    (((0, b'GIF8'),), 'image/gif'),
+    (((0, b'RIFF'), (8, b'WEBP')), 'image/webp'),
+)
+
+
+def sniff_type(data):
+    for magics, mimetype in TYPES:
+        if all(data[offset:offset + len(magic)] == magic for offset, magic in magics):
+            return mimetype
+    return None
+
+
+def init_app(app):
+    # Found without importing it, so startup stays fast
+    if importlib.util.find_spec('PIL') is None:
+        app.logger.warning('Pillow is not installed; images behind |thumb are served at full size')
+
+
+def resize(data, width):
+    try:
+        from PIL import Image
+    except ImportError:
+        # Without Pillow, serve the original
+        return data
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width <= width:
+            return data
+        height = max(round(image.height * width / image.width), 1)
+        image = image.resize((width, height), Image.LANCZOS)
+    except (Image.DecompressionBombError, OSError) as e:
+        # UnidentifiedImageError and truncated files are OSErrors
+        raise FetchError(f'Unreadable image: {e}')
+
+    out = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(out, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(out, 'JPEG', quality=85, optimize=True)
+
+    return out.getvalue()
+
+#----------------------------------------------------------------------------#
+# Disk Cache
+#----------------------------------------------------------------------------#
+
+class DiskCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(current_app.config['IMAGE_CACHE_DIR'], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # Mark as recently used
+        os.utime(path)
+
+        return data
+
+    def put(self, key, data):
+        cache_dir = current_app.config['IMAGE_CACHE_DIR']
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Write atomically so concurrent readers never see partial files
+        path = self.path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        self.evict(cache_dir)
+
+    def evict(self, cache_dir):
+        # Drop least recently used files until the cache fits its budget
+        max_bytes = current_app.config.get('IMAGE_CACHE_MAX_BYTES', 100 * 1024 * 1024)
+        with self.lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(cache_dir):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+cache = DiskCache()
+
+
+def get_thumbnail(url, width):
+    key = hashlib.sha256(url.encode()).hexdigest()
+
+    data = cache.get(f'{key}_{width}')
+    if data is None:
+        # Fetch the original only once for all sizes
+        original = cache.get(f'{key}_0')
+        fetched = original is None
+        if fetched:
+            original = get_fetcher()(url)
+            if not sniff_type(original):
+                raise FetchError('Not an image')
+        # Raises FetchError for files Pillow can't read, so they aren't cached
+        data = resize(original, width)
+        if fetched:
+            cache.put(f'{key}_0', original)
+        cache.put(f'{key}_{width}', data)
+
+    return f'{key}_{width}', data
@@ -0,0 +1,353 @@
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.pool import NullPool
+
+from models import db
+from request_log import JsonFormatter
+
+logger = logging.getLogger('fyyur.jobs')
+
+#----------------------------------------------------------------------------#
+# Cron Schedules
+#----------------------------------------------------------------------------#
+
+# minute hour day-of-month month day-of-week (0 = Sunday), in UTC
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def parse_field(text, low, high):
+    # Supports *, n, a-b, lists and /step
+    values = set()
+    for part in text.split(','):
+        expr, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if expr == '*':
+            start, end = low, high
+        elif '-' in expr:
+            start, end = (int(n) for n in expr.split('-', 1))
+        else:
+            start = int(expr)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f'Invalid cron field: {text}')
+        values.update(range(start, end + 1, step))
+
+    return frozenset(values)
+
+
+class Cron:
+    def __init__(self, spec):
+        parts = spec.split()
+        if len(parts) != 5:
+            raise ValueError(f'Cron schedules have 5 fields: {spec}')
+        self.spec = spec
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            parse_field(part, low, high) for part, (low, high) in zip(parts, CRON_FIELDS)
+        )
+        # As in cron, a restricted day-of-month and day-of-week match either
+        self.either_day = parts[2] != '*' and parts[4] != '*'
+
+    def day_matches(self, t):
+        day = t.day in self.days
+        weekday = (t.weekday() + 1) % 7 in self.weekdays
+        return day or weekday if self.either_day else day and weekday
+
+    def next_after(self, t):
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end = t + timedelta(days=366 * 5)
+        while t < end:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self.day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f'Cron schedule never matches: {self.spec}')
+
+#----------------------------------------------------------------------------#
+# Jobs
+#----------------------------------------------------------------------------#
+
+class Job:
+    def __init__(self, name, fn, every=None, cron=None, leader=True):
+        if (every is None) == (cron is None):
+            raise ValueError('Give a job either an interval or a cron schedule')
+        self.name = name
+        self.fn = fn
+        self.every = every
+        self.cron = Cron(cron) if cron else None
+        # Leader jobs run in one process at a time; others run in every worker
+        self.leader = leader
+
+        self.next_run = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_ms = None
+        self.max_ms = 0.0
+        self.total_ms = 0.0
+        self.last_error = None
+
+    def next_after(self, ts):
+        if self.every:
+            return ts + self.every
+        return self.cron.next_after(datetime.fromtimestamp(ts, timezone.utc)).timestamp()
+
+    def schedule(self):
+        return f'every {self.every}s' if self.every else self.cron.spec
+
+    def metrics(self):
+        return {
+            'name': self.name,
+            'schedule': self.schedule(),
+            'leader_only': self.leader,
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'last_run': self.last_run,
+            'last_ms': self.last_ms,
+            'avg_ms': round(self.total_ms / self.runs, 3) if self.runs else None,
+            'max_ms': self.max_ms,
+            'last_error': self.last_error,
+            'next_run': self.next_run,
+        }
+
+
+JOBS = {}
+
+
+def job(name, every=None, cron=None, leader=True):
+    def register(fn):
+        JOBS[name] = Job(name, fn, every=every, cron=cron, leader=leader)
+        return fn
+
+    return register
+
+
+@job('archive-shows', cron='0 3 * * *')
+def archive_old_shows():
+    from archive import archive_shows
+    from helpers import time_now
+    days = current_app.config.get('SHOW_RETENTION_DAYS', 365)
+    return archive_shows(time_now() - timedelta(days=days))
+
+
+@job('rebuild-popularity', cron='30 3 * * *')
+def rescale_popularity():
+    # Moves the decay landmark to now, so recent shows keep counting fully
+    from popularity import rebuild_popularity
+    return rebuild_popularity()
+
+
+@job('refresh-indexes', every=10, leader=False)
+def refresh_indexes():
+    # Pick up writes made by other workers from the change log
+    from autocomplete import sync_index
+    from matchmaking import sync_index as sync_match_index
+    sync_index()
+    sync_match_index()
+
+#----------------------------------------------------------------------------#
+# Leader Election
+#----------------------------------------------------------------------------#
+
+class Election:
+    # The first worker to take a job's Postgres advisory lock leads it for as
+    # long as its connection lives; other databases imply a single process
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.engine = None
+        self.conn = None
+
+    def lead(self, name):
+        engine = db.get_engine(current_app)
+        if engine.dialect.name != 'postgresql':
+            return True
+
+        key = zlib.crc32(('fyyur.jobs.' + name).encode())
+        with self.lock:
+            try:
+                if self.conn is None:
+                    # Held for the life of the process, so kept out of the pool
+                    self.engine = sa.create_engine(engine.url, poolclass=NullPool)
+                    self.conn = self.engine.connect()
+                # Re-taking a lock this session holds succeeds
+                return self.conn.execute(sa.text('SELECT pg_try_advisory_lock(:key)'), key=key).scalar()
+            except sa.exc.DBAPIError:
+                # Locks die with the connection; rejoin the election next time
+                logger.exception('Leader election failed')
+                self.release()
+                return False
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except sa.exc.DBAPIError:
+                pass
+        self.conn = None
+
+
+election = Election()
+
+#----------------------------------------------------------------------------#
+# Running
+#----------------------------------------------------------------------------#
+
+def run_job(app, job):
+    with app.app_context():
+        try:
+            if job.leader and not election.lead(job.name):
+                return False
+
+            start = time.perf_counter()
+            job.last_run = time.time()
+            error = None
+            try:
+                job.fn()
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                logger.exception('Job %s failed', job.name)
+            finally:
+                db.session.remove()
+
+            ms = round((time.perf_counter() - start) * 1000, 3)
+            job.runs += 1
+            job.failures += error is not None
+            job.last_ms = ms
+            job.max_ms = max(job.max_ms, ms)
+            job.total_ms += ms
+            job.last_error = error
+            logger.info({'job': job.name, 'ms': ms, 'ok': error is None})
+            return True
+        finally:
+            job.running = False
+
+
+class Scheduler:
+    def __init__(self, app, jobs, threads=2):
+        self.app = app
+        self.jobs = list(jobs)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='jobs')
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        now = time.time()
+        for job in self.jobs:
+            job.next_run = job.next_after(now)
+        self.thread = threading.Thread(target=self.loop, name='scheduler', daemon=True)
+        self.thread.start()
+
+    def tick(self, now):
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+            # Missed runs are not made up
+            job.next_run = job.next_after(now)
+            if job.running:
+                job.skipped += 1
+                logger.warning({'job': job.name, 'skipped': 'still running'})
+                continue
+            job.running = True
+            self.pool.submit(run_job, self.app, job)
+
+    def loop(self):
+        while not self.stopping.is_set():
+            self.tick(time.time())
+            wait = min(job.next_run for job in self.jobs) - time.time()
+            self.stopping.wait(min(max(wait, 0), 60))
+
+    def stop(self, wait=True):
+        self.stopping.set()
+        self.pool.shutdown(wait=wait)
+
+
+scheduler = None
+
+
+def start_scheduler(app):
+    # Called by each worker once it is ready. Jobs run by every worker keep
+    # its caches current and always run; leader jobs need JOBS_ENABLED
+    global scheduler
+    jobs = [job for job in JOBS.values() if not job.leader or app.config.get('JOBS_ENABLED')]
+    if scheduler is not None or not jobs:
+        return scheduler
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    scheduler = Scheduler(app, jobs, app.config.get('JOBS_THREADS', 2))
+    scheduler.start()
+    return scheduler
+
+#----------------------------------------------------------------------------#
+# Commands
+#----------------------------------------------------------------------------#
+
+def format_time(ts):
+    if ts is None:
+        return '-'
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+
+
+@click.group('jobs')
+def jobs_command():
+    """Inspect and run background jobs."""
+
+
+@jobs_command.command('list')
+def list_command():
+    now = time.time()
+    for job in JOBS.values():
+        scope = 'leader' if job.leader else 'every worker'
+        click.echo(f'{job.name:<20} {job.schedule():<16} {scope:<13} next {format_time(job.next_after(now))}')
+
+
+@jobs_command.command('run')
+@click.argument('name')
+@with_appcontext
+def run_command(name):
+    if name not in JOBS:
+        raise click.BadParameter(f'Unknown job: {name}', param_hint='NAME')
+    job = JOBS[name]
+    if not run_job(current_app._get_current_object(), job):
+        raise click.ClickException(f'Another process leads {name}')
+    if job.last_error:
+        raise click.ClickException(f'{name} failed after {job.last_ms} ms: {job.last_error}')
+    click.echo(f'Ran {name} in {job.last_ms} ms.')
+
+
+@jobs_command.command('start')
+@with_appcontext
+def start_command():
+    # Run the scheduler in this process, e.g. alongside a single worker
+    app = current_app._get_current_object()
+    app.config['JOBS_ENABLED'] = True
+    start_scheduler(app)
+    click.echo(f'Running {len(JOBS)} jobs. Press Ctrl+C to stop.')
+    try:
+        while scheduler.thread.is_alive():
+            scheduler.thread.join(1)
+    except KeyboardInterrupt:
+        scheduler.stop()
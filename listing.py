@@ -0,0 +1,101 @@
+import click
+from flask.cli import with_appcontext
+
+from models import db, Venue, Artist, Show, ShowArchive, ShowListing
+
+#----------------------------------------------------------------------------#
+# Show Listing
+#----------------------------------------------------------------------------#
+
+listing = ShowListing.__table__
+
+COLUMNS = ['id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link']
+
+
+def select_rows(shows):
+    # Listing rows for the given Show or ShowArchive table
+    return db.select([
+        shows.c.id,
+        shows.c.start_time,
+        Venue.id,
+        Venue.name,
+        Artist.id,
+        Artist.name,
+        Artist.image_link,
+    ]).select_from(
+        shows.join(Venue, shows.c.venue_id == Venue.id).join(Artist, shows.c.artist_id == Artist.id),
+    )
+
+
+def rebuild_listing():
+    # Repopulate from scratch, e.g. after bulk loads that skip the ORM
+    try:
+        db.session.execute(listing.delete())
+        for shows in (Show.__table__, ShowArchive.__table__):
+            db.session.execute(listing.insert().from_select(COLUMNS, select_rows(shows)))
+        count = db.session.query(db.func.count(listing.c.id)).scalar()
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+
+    return count
+
+
+@click.command('rebuild-listing')
+@with_appcontext
+def rebuild_listing_command():
+    count = rebuild_listing()
+    click.echo(f'Rebuilt show listing with {count} shows.')
+
+#----------------------------------------------------------------------------#
+# Sync
+#----------------------------------------------------------------------------#
+
+def _changed(obj, *attrs):
+    state = db.inspect(obj)
+    return any(state.attrs[a].history.has_changes() for a in attrs)
+
+
+def _sync_listing(session, flush_context):
+    # Runs inside the flush, so listing rows commit or roll back with the write
+    refresh = set()
+    removed = set()
+    for obj in session.new:
+        if isinstance(obj, Show):
+            refresh.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Show) and _changed(obj, 'start_time', 'venue_id', 'artist_id'):
+            refresh.add(obj.id)
+        elif isinstance(obj, Venue) and _changed(obj, 'name'):
+            session.execute(
+                listing.update().where(listing.c.venue_id == obj.id).values(venue_name=obj.name)
+            )
+        elif isinstance(obj, Artist) and _changed(obj, 'name', 'image_link'):
+            session.execute(
+                listing.update().where(listing.c.artist_id == obj.id).values(
+                    artist_name=obj.name,
+                    artist_image_link=obj.image_link,
+                )
+            )
+    for obj in session.deleted:
+        if isinstance(obj, Show):
+            removed.add(obj.id)
+        elif isinstance(obj, Venue):
+            session.execute(listing.delete().where(listing.c.venue_id == obj.id))
+        elif isinstance(obj, Artist):
+            session.execute(listing.delete().where(listing.c.artist_id == obj.id))
+
+    if refresh | removed:
+        session.execute(listing.delete().where(listing.c.id.in_(refresh | removed)))
+    if refresh:
+        shows = Show.__table__
+        session.execute(listing.insert().from_select(
+            COLUMNS,
+            select_rows(shows).where(shows.c.id.in_(refresh)),
+        ))
+
+
+db.event.listen(db.session, 'after_flush', _sync_listing)
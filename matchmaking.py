@@ -0,0 +1,300 @@
+import threading
+from collections import namedtuple
+
+from models import db, Venue, Artist
+from search import ENTITIES
+from changelog import Follower, settle_time
+
+#----------------------------------------------------------------------------#
+# Bitsets
+#----------------------------------------------------------------------------#
+
+# Sets of entity ids are Python ints with bit `id` set, so unions and
+# intersections over a million ids are a handful of C-level big-int ops
+
+def to_bits(ids):
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for id in ids:
+        buf[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def iter_bits(bits):
+    # Set bits from lowest to highest id
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+#----------------------------------------------------------------------------#
+# Match Index
+#----------------------------------------------------------------------------#
+
+KINDS = {Venue: 'venue', Artist: 'artist'}
+OTHER = {'venue': 'artist', 'artist': 'venue'}
+
+# Score = GENRE_WEIGHT per shared genre + location + availability
+GENRE_WEIGHT = 3
+LOCATION_WEIGHTS = {'city': 2, 'state': 1, None: 0}
+SEEKING_WEIGHT = 1
+
+Entry = namedtuple('Entry', ['name', 'city', 'state', 'seeking', 'genres'])
+
+
+def fold(text):
+    return ' '.join((text or '').casefold().split())
+
+
+class Side:
+    # Inverted index over one kind: attribute value -> bitset of ids
+    def __init__(self):
+        self.all = 0
+        self.seeking = 0
+        self.genres = {}
+        self.cities = {}
+        self.states = {}
+        self.entries = {}
+
+    def _set(self, index, key, id, on):
+        bits = index.get(key, 0)
+        bits = bits | (1 << id) if on else bits & ~(1 << id)
+        if bits:
+            index[key] = bits
+        else:
+            index.pop(key, None)
+
+    def _update(self, id, entry, on):
+        bit = 1 << id
+        self.all = self.all | bit if on else self.all & ~bit
+        if entry.seeking:
+            self.seeking = self.seeking | bit if on else self.seeking & ~bit
+        for genre_id in entry.genres:
+            self._set(self.genres, genre_id, id, on)
+        self._set(self.cities, (fold(entry.city), entry.state), id, on)
+        self._set(self.states, entry.state, id, on)
+
+    def add(self, id, entry):
+        self.remove(id)
+        self.entries[id] = entry
+        self._update(id, entry, True)
+
+    def remove(self, id):
+        entry = self.entries.pop(id, None)
+        if entry is not None:
+            self._update(id, entry, False)
+
+    def build(self, entries):
+        self.entries = dict(entries)
+        by_genre, by_city, by_state, seeking = {}, {}, {}, []
+        for id, e in self.entries.items():
+            for genre_id in e.genres:
+                by_genre.setdefault(genre_id, []).append(id)
+            by_city.setdefault((fold(e.city), e.state), []).append(id)
+            by_state.setdefault(e.state, []).append(id)
+            if e.seeking:
+                seeking.append(id)
+        self.all = to_bits(list(self.entries))
+        self.seeking = to_bits(seeking)
+        self.genres = {k: to_bits(ids) for k, ids in by_genre.items()}
+        self.cities = {k: to_bits(ids) for k, ids in by_city.items()}
+        self.states = {k: to_bits(ids) for k, ids in by_state.items()}
+
+
+class MatchIndex:
+    def __init__(self):
+        self.sides = {'venue': Side(), 'artist': Side()}
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def build(self, entries):
+        sides = {'venue': Side(), 'artist': Side()}
+        for kind, rows in entries.items():
+            sides[kind].build(rows)
+        with self.lock:
+            self.sides = sides
+            self.ready = True
+
+    def add(self, kind, id, entry):
+        with self.lock:
+            self.sides[kind].add(id, entry)
+
+    def remove(self, kind, id):
+        with self.lock:
+            self.sides[kind].remove(id)
+
+    def recommend(self, kind, id, limit=10):
+        # Rank the other kind for entity `id`; None if it is unknown
+        with self.lock:
+            source = self.sides[kind].entries.get(id)
+            if source is None:
+                return None
+            side = self.sides[OTHER[kind]]
+
+            # Bit-sliced counters: plane i holds bit i of each id's genre overlap
+            planes = []
+            for genre_id in source.genres:
+                carry = side.genres.get(genre_id, 0)
+                for i in range(len(planes)):
+                    if not carry:
+                        break
+                    planes[i], carry = planes[i] ^ carry, planes[i] & carry
+                if carry:
+                    planes.append(carry)
+
+            def overlap(k):
+                if k >> len(planes):
+                    return 0
+                bits = side.all
+                for i, plane in enumerate(planes):
+                    bits &= plane if k >> i & 1 else side.all ^ plane
+                return bits
+
+            city = side.cities.get((fold(source.city), source.state), 0)
+            state = side.states.get(source.state, 0)
+            locations = {'city': city, 'state': state & ~city, None: side.all & ~state}
+            availability = {True: side.seeking, False: side.all ^ side.seeking}
+
+            # Walk score tiers from best to worst until the limit is reached
+            tiers = sorted(
+                (
+                    (k * GENRE_WEIGHT + LOCATION_WEIGHTS[loc] + SEEKING_WEIGHT * seeking, k, loc, seeking)
+                    for k in range(len(source.genres), -1, -1)
+                    for loc in LOCATION_WEIGHTS
+                    for seeking in (True, False)
+                    # Entities sharing neither genre nor place are not matches
+                    if k or loc
+                ),
+                key=lambda t: (t[0], t[1]),
+                reverse=True,
+            )
+            results = []
+            cache = {}
+            for score, k, loc, seeking in tiers:
+                if k not in cache:
+                    cache[k] = overlap(k)
+                bits = cache[k] & locations[loc] & availability[seeking]
+                for match_id in iter_bits(bits):
+                    entry = side.entries[match_id]
+                    results.append({
+                        'id': match_id,
+                        'name': entry.name,
+                        'score': score,
+                        'shared_genres': k,
+                        'location': loc,
+                        'seeking': seeking,
+                    })
+                    if len(results) >= limit:
+                        return results
+
+        return results
+
+
+index = MatchIndex()
+
+#----------------------------------------------------------------------------#
+# Loading & Sync
+#----------------------------------------------------------------------------#
+
+def load_entries(kind, ids=None):
+    e = ENTITIES[kind]
+    model, assoc, owner = e['model'], e['assoc'], e['owner_id']
+
+    genres = {}
+    links = db.session.query(owner, assoc.c.genre_id)
+    rows = db.session.query(model.id, model.name, model.city, model.state, e['seeking'].label('seeking'))
+    if ids is not None:
+        links = links.filter(owner.in_(ids))
+        rows = rows.filter(model.id.in_(ids))
+    for owner_id, genre_id in links:
+        genres.setdefault(owner_id, []).append(genre_id)
+
+    return {
+        r.id: Entry(r.name, r.city, r.state, bool(r.seeking), frozenset(genres.get(r.id, ())))
+        for r in rows
+    }
+
+
+def build_index():
+    follower.reset(settle_time())
+    index.build({kind: load_entries(kind) for kind in OTHER})
+
+
+def ensure_index():
+    if not index.ready:
+        build_index()
+
+
+def refresh(kind, ids):
+    # Reload entities changed outside the ORM (e.g. by admin bulk operations)
+    if not index.ready or not ids:
+        return
+    for id, entry in load_entries(kind, ids).items():
+        index.add(kind, id, entry)
+
+
+def _apply_log(changes):
+    # Entities are reloaded rather than decoded from the entries, which carry
+    # genre names; ids deleted later in the batch load nothing
+    changed = {kind: set() for kind in OTHER}
+    deleted = []
+    for change in changes:
+        if change.entity not in changed:
+            continue
+        if change.op == 'delete':
+            deleted.append((change.entity, change.entity_id))
+        else:
+            changed[change.entity].add(change.entity_id)
+    for kind, ids in changed.items():
+        refresh(kind, ids)
+    for kind, id in deleted:
+        index.remove(kind, id)
+
+
+follower = Follower(_apply_log)
+
+
+def sync_index():
+    # Applies writes committed by other workers, which the commit hooks below
+    # never see
+    if not index.ready:
+        build_index()
+    else:
+        follower.catch_up(settle_time())
+
+
+def _entry(obj):
+    seeking = obj.seeking_talent if isinstance(obj, Venue) else obj.seeking_venue
+    return Entry(obj.name, obj.city, obj.state, bool(seeking), frozenset(g.id for g in obj.genres))
+
+
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault('match_changes', {})
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) in KINDS:
+            changes[(KINDS[type(obj)], obj.id)] = _entry(obj)
+    for obj in session.deleted:
+        if type(obj) in KINDS:
+            changes[(KINDS[type(obj)], obj.id)] = None
+
+
+def _apply_changes(session):
+    changes = session.info.pop('match_changes', {})
+    if not index.ready:
+        return
+    for (kind, id), entry in changes.items():
+        if entry is None:
+            index.remove(kind, id)
+        else:
+            index.add(kind, id, entry)
+
+
+def _discard_changes(session):
+    session.info.pop('match_changes', None)
+
+
+# Keep the index in step with committed writes
+db.event.listen(db.session, 'after_flush', _collect_changes)
+db.event.listen(db.session, 'after_commit', _apply_changes)
+db.event.listen(db.session, 'after_rollback', _discard_changes)
@@ -1,5 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+import json
+
+from routing import RoutingSQLAlchemy, listen
+db = RoutingSQLAlchemy()
+listen(db)
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
@@ -15,6 +18,14 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    # Blocking keys for duplicate detection, set by dedupe.py
+    name_key = db.Column(db.String, index=True)
+    phonetic_key = db.Column(db.String, index=True)
+
+    # Optimistic locking: updates fail if the row changed since it was loaded
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<Venue ID: {self.id}, name: {self.name}>'
@@ -33,6 +44,7 @@ class Venue(db.Model):
             'seeking_talent': self.seeking_talent,
             'seeking_description': self.seeking_description,
             'genres': [g.name for g in self.genres],
+            'version': self.version,
         }
 
 class Artist(db.Model):
@@ -48,6 +60,14 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    # Blocking keys for duplicate detection, set by dedupe.py
+    name_key = db.Column(db.String, index=True)
+    phonetic_key = db.Column(db.String, index=True)
+
+    # Optimistic locking: updates fail if the row changed since it was loaded
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<Artist ID: {self.id}, name: {self.name}>'
@@ -65,10 +85,17 @@ class Artist(db.Model):
             'seeking_venue': self.seeking_venue,
             'seeking_description': self.seeking_description,
             'genres': [g.name for g in self.genres],
+            'version': self.version,
         }
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # Range lookups of shows by venue, by artist and by date
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime)
@@ -90,14 +117,106 @@ class Show(db.Model):
             'artist_id': self.artist_id,
         }
 
+class ShowArchive(db.Model):
+    __tablename__ = 'ShowArchive'
+    __table_args__ = (
+        # Past shows of a venue or artist, as on Show
+        db.Index('ix_ShowArchive_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_ShowArchive_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    # Past shows moved out of Show by `flask archive-shows`; ids are kept
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime, index=True)
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+
+    def __repr__(self):
+        return f'<ShowArchive ID: {self.id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'start_time': self.start_time,
+            'venue_id': self.venue_id,
+            'artist_id': self.artist_id,
+        }
+
+class ShowListing(db.Model):
+    __tablename__ = 'ShowListing'
+    __table_args__ = (
+        # Matches the /shows sort order, so listing needs no join or sort
+        db.Index('ix_ShowListing_start_time_artist_name_venue_name',
+                 'start_time', 'artist_name', 'venue_name'),
+    )
+
+    # Read model for /shows: one row per live or archived show, with the names
+    # copied in; kept up to date by listing.py
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime)
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False, index=True)
+    venue_name = db.Column(db.String)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False, index=True)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+
+    def __repr__(self):
+        return f'<ShowListing ID: {self.id}>'
+
+class Popularity(db.Model):
+    __tablename__ = 'Popularity'
+    __table_args__ = (
+        # Top-K by kind is an index-ordered scan
+        db.Index('ix_Popularity_kind_score', 'kind', 'score'),
+    )
+
+    # Time-decayed show count per venue and artist, kept by popularity.py
+    kind = db.Column(db.String(10), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    score = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<Popularity {self.kind} {self.entity_id}: {self.score}>'
+
+class ChangeLog(db.Model):
+    __tablename__ = 'ChangeLog'
+
+    # Append-only outbox of catalogue writes, read by /api/changes; the id is
+    # the sync cursor
+    id = db.Column(db.Integer, primary_key=True)
+    ts = db.Column(db.DateTime, nullable=False)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<ChangeLog ID: {self.id}, {self.op} {self.entity} {self.entity_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'ts': self.ts.isoformat(),
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'op': self.op,
+            'data': json.loads(self.data) if self.data else None,
+        }
+
 # Create association tables for genre
 venue_genre = db.Table('venue_genre',
     db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
-    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True)
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    # Reverse index for looking up venues by genre
+    db.Index('ix_venue_genre_genre_id_venue_id', 'genre_id', 'venue_id'),
 )
 artist_genre = db.Table('artist_genre',
     db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
-    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True)
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    # Reverse index for looking up artists by genre
+    db.Index('ix_artist_genre_genre_id_artist_id', 'genre_id', 'artist_id'),
 )
 
 class Genre(db.Model):
@@ -0,0 +1,226 @@
+import math
+from datetime import datetime, timezone
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Venue, Artist, Show, ShowArchive, Popularity
+from helpers import time_now
+
+#----------------------------------------------------------------------------#
+# Forward Decay
+#----------------------------------------------------------------------------#
+
+# Each show adds exp(rate * (min(start_time, landmark) - landmark)) to its
+# venue's and artist's score. Ranking by these stored sums equals ranking by
+# decayed counts, since decaying to "now" divides every score by the same
+# factor; scores therefore only change when shows are written. Shows after the
+# landmark, booked ahead or played since, count at the landmark's full weight
+# of 1, so scores stay bounded by show counts. The landmark is stored as a
+# row of the table and moved to the present by `flask rebuild-popularity`
+# (run nightly by the rebuild-popularity job), which recomputes every score.
+HALF_LIFE_DAYS = 30
+
+RATE = math.log(2) / (HALF_LIFE_DAYS * 86400)
+
+# Scores below this (shows about 20 half-lives old) no longer count as trending
+MIN_SCORE = 1e-6
+
+popularity = Popularity.__table__
+
+LANDMARK_KIND = 'landmark'
+
+
+def as_naive_utc(value):
+    # Shows created from forms may still hold the submitted string
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def show_weight(start_time, landmark):
+    if start_time is None:
+        return 0.0
+    age = (landmark - as_naive_utc(start_time)).total_seconds()
+    return math.exp(-RATE * max(age, 0))
+
+
+def get_landmark(session):
+    # A shared lock, so that a rebuild waits for writes in progress and
+    # writes wait for the rebuild to settle on a new landmark
+    seconds = session.execute(
+        db.select([popularity.c.score]).where(
+            popularity.c.kind == LANDMARK_KIND,
+        ).with_for_update(read=True)
+    ).scalar()
+    if seconds is None:
+        # Tables made by create_all start without one
+        landmark = time_now().replace(tzinfo=None)
+        session.execute(popularity.insert(), {
+            'kind': LANDMARK_KIND,
+            'entity_id': 0,
+            'score': landmark.replace(tzinfo=timezone.utc).timestamp(),
+        })
+        return landmark
+
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+#----------------------------------------------------------------------------#
+# Top-K
+#----------------------------------------------------------------------------#
+
+KINDS = {'venue': Venue, 'artist': Artist}
+KINDS_BY_MODEL = {model: kind for kind, model in KINDS.items()}
+
+
+def top(kind, limit=10):
+    # Walks the (kind, score) index; names are looked up by primary key
+    model = KINDS[kind]
+    rows = db.session.query(
+        model.id.label('id'),
+        model.name.label('name'),
+    ).select_from(popularity).join(
+        model, model.id == popularity.c.entity_id,
+    ).filter(
+        popularity.c.kind == kind,
+        popularity.c.score >= MIN_SCORE,
+    ).order_by(
+        popularity.c.score.desc(),
+    ).limit(limit)
+
+    return [{'id': r.id, 'name': r.name} for r in rows]
+
+#----------------------------------------------------------------------------#
+# Sync
+#----------------------------------------------------------------------------#
+
+def apply_deltas(session, deltas):
+    # {(kind, id): change in score}, applied in one executemany
+    if not deltas:
+        return
+    session.execute(
+        popularity.update().where(
+            popularity.c.kind == db.bindparam('k'),
+        ).where(
+            popularity.c.entity_id == db.bindparam('id'),
+        ).values(
+            score=popularity.c.score + db.bindparam('delta'),
+        ),
+        [{'k': k, 'id': id, 'delta': delta} for (k, id), delta in deltas.items()],
+    )
+
+
+def _old(state, attr):
+    # Value before this flush
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, attr)
+
+
+def _sync_popularity(session, flush_context):
+    # Runs inside the flush, so scores commit or roll back with the shows
+    created = []
+    removed = []
+    deltas = {}
+    landmark = []
+
+    def weight(start_time):
+        if not landmark:
+            landmark.append(get_landmark(session))
+        return show_weight(start_time, landmark[0])
+
+    def add(kind, id, weight):
+        if id is not None and weight:
+            deltas[(kind, id)] = deltas.get((kind, id), 0.0) + weight
+
+    for obj in session.new:
+        if isinstance(obj, (Venue, Artist)):
+            created.append({'kind': KINDS_BY_MODEL[type(obj)], 'entity_id': obj.id, 'score': 0.0})
+        elif isinstance(obj, Show):
+            w = weight(obj.start_time)
+            add('venue', obj.venue_id, w)
+            add('artist', obj.artist_id, w)
+    for obj in session.dirty:
+        if isinstance(obj, Show) and session.is_modified(obj):
+            state = db.inspect(obj)
+            old_weight = weight(_old(state, 'start_time'))
+            add('venue', _old(state, 'venue_id'), -old_weight)
+            add('artist', _old(state, 'artist_id'), -old_weight)
+            w = weight(obj.start_time)
+            add('venue', obj.venue_id, w)
+            add('artist', obj.artist_id, w)
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            removed.append((KINDS_BY_MODEL[type(obj)], obj.id))
+        elif isinstance(obj, Show):
+            w = weight(obj.start_time)
+            add('venue', obj.venue_id, -w)
+            add('artist', obj.artist_id, -w)
+
+    if created:
+        session.execute(popularity.insert(), created)
+    apply_deltas(session, deltas)
+    for kind, id in removed:
+        session.execute(
+            popularity.delete().where(popularity.c.kind == kind).where(popularity.c.entity_id == id)
+        )
+
+
+db.event.listen(db.session, 'after_flush', _sync_popularity)
+
+#----------------------------------------------------------------------------#
+# Rebuild
+#----------------------------------------------------------------------------#
+
+def rebuild_popularity():
+    # Move the landmark to now and recompute every score from live and
+    # archived shows
+    try:
+        db.session.execute(
+            db.select([popularity.c.score]).where(
+                popularity.c.kind == LANDMARK_KIND,
+            ).with_for_update()
+        )
+        landmark = time_now().replace(tzinfo=None)
+
+        scores = {}
+        for kind, model in KINDS.items():
+            for (id,) in db.session.query(model.id):
+                scores[(kind, id)] = 0.0
+        for table in (Show.__table__, ShowArchive.__table__):
+            rows = db.session.query(table.c.venue_id, table.c.artist_id, table.c.start_time).yield_per(1000)
+            for venue_id, artist_id, start_time in rows:
+                weight = show_weight(start_time, landmark)
+                for key in (('venue', venue_id), ('artist', artist_id)):
+                    if key in scores:
+                        scores[key] += weight
+
+        db.session.execute(popularity.delete())
+        rows = [
+            {'kind': kind, 'entity_id': id, 'score': score}
+            for (kind, id), score in scores.items()
+        ]
+        rows.append({
+            'kind': LANDMARK_KIND,
+            'entity_id': 0,
+            'score': landmark.replace(tzinfo=timezone.utc).timestamp(),
+        })
+        db.session.execute(popularity.insert(), rows)
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+
+    return len(scores)
+
+
+@click.command('rebuild-popularity')
+@with_appcontext
+def rebuild_popularity_command():
+    count = rebuild_popularity()
+    click.echo(f'Rebuilt popularity scores for {count} venues and artists.')
@@ -0,0 +1,226 @@
+from flask import current_app
+from sqlalchemy.ext import baked
+
+from models import db, Venue, Artist, Show, ShowListing
+from helpers import time_now
+from archive import show_history
+
+#----------------------------------------------------------------------------#
+# Cached Queries
+#----------------------------------------------------------------------------#
+
+# Hot read routes build their queries once; later requests reuse the cached
+# Query construction and compiled SQL, only binding new parameters.
+bakery = baked.bakery()
+
+# Upcoming shows are always live; past shows may have been archived
+live_shows = Show.__table__
+all_shows = show_history()
+
+
+def show_source(upcoming):
+    return live_shows if upcoming else all_shows
+
+
+def cutoff_in_db():
+    return current_app.config.get('SHOW_CUTOFF_IN_DB', False)
+
+
+def show_cutoff():
+    # Past/upcoming boundary, either the database clock or a bound value
+    if cutoff_in_db():
+        return db.func.now()
+    return db.bindparam('cutoff')
+
+
+def cutoff_params():
+    return {} if cutoff_in_db() else {'cutoff': time_now()}
+
+
+def _add_cutoff(bq, upcoming, shows):
+    # Each branch is its own lambda so that it gets its own cache key
+    if cutoff_in_db():
+        if upcoming:
+            bq += lambda q: q.filter(shows.c.start_time > db.func.now())
+        else:
+            bq += lambda q: q.filter(shows.c.start_time < db.func.now())
+    else:
+        if upcoming:
+            bq += lambda q: q.filter(shows.c.start_time > db.bindparam('cutoff'))
+        else:
+            bq += lambda q: q.filter(shows.c.start_time < db.bindparam('cutoff'))
+
+    return bq
+
+
+def _add_range(bq, shows):
+    bq += lambda q: q.filter(
+        shows.c.start_time >= db.bindparam('start'),
+        shows.c.start_time < db.bindparam('end'),
+    )
+
+    return bq
+
+
+def _run(bq, **params):
+    return bq(db.session()).params(**params, **cutoff_params()).all()
+
+
+# Rows fetched per round trip when a list is streamed
+STREAM_BATCH = 100
+
+
+def _stream(bq, **params):
+    # Yield rows as they are fetched instead of loading the whole list; the
+    # query only runs once iteration starts. yield_per also sets stream_results,
+    # so on Postgres the rows come from a server-side cursor. Rows are
+    # slotted named tuples that templates read directly.
+    bq += lambda q: q.yield_per(STREAM_BATCH)
+    yield from bq(db.session()).params(**params)
+
+#----------------------------------------------------------------------------#
+# Venues
+#----------------------------------------------------------------------------#
+
+def venue_list():
+    bq = bakery(lambda s: s.query(
+        Venue.id.label('id'),
+        Venue.name.label('name'),
+        Venue.city.label('city'),
+        Venue.state.label('state'),
+    ))
+    bq += lambda q: q.order_by(Venue.city, Venue.state, Venue.name)
+
+    return _stream(bq)
+
+
+def venue_shows(venue_id, upcoming):
+    # The source is part of the cache key, so live and history queries differ
+    shows = show_source(upcoming)
+    bq = bakery(lambda s: s.query(
+        shows.c.start_time.label('start_time'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+    ).select_from(shows), upcoming)
+    bq += lambda q: q.filter(shows.c.venue_id == db.bindparam('venue_id'))
+    bq += lambda q: q.outerjoin(Artist, shows.c.artist_id == Artist.id)
+    bq = _add_cutoff(bq, upcoming, shows)
+
+    # For past shows, display latest one first
+    if upcoming:
+        bq += lambda q: q.order_by(shows.c.start_time)
+    else:
+        bq += lambda q: q.order_by(shows.c.start_time.desc())
+
+    return _run(bq, venue_id=venue_id)
+
+
+def venue_calendar(venue_id, start, end):
+    shows = all_shows
+    bq = bakery(lambda s: s.query(
+        shows.c.id.label('id'),
+        shows.c.start_time.label('start_time'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+    ).select_from(shows))
+    bq += lambda q: q.filter(shows.c.venue_id == db.bindparam('venue_id'))
+    bq = _add_range(bq, shows)
+    bq += lambda q: q.outerjoin(Artist, shows.c.artist_id == Artist.id)
+    bq += lambda q: q.order_by(shows.c.start_time)
+
+    return bq(db.session()).params(venue_id=venue_id, start=start, end=end).all()
+
+#----------------------------------------------------------------------------#
+# Artists
+#----------------------------------------------------------------------------#
+
+def artist_list():
+    bq = bakery(lambda s: s.query(
+        Artist.id.label('id'),
+        Artist.name.label('name'),
+    ))
+    bq += lambda q: q.order_by(Artist.name)
+
+    return _stream(bq)
+
+
+def artist_shows(artist_id, upcoming):
+    # The source is part of the cache key, so live and history queries differ
+    shows = show_source(upcoming)
+    bq = bakery(lambda s: s.query(
+        shows.c.start_time.label('start_time'),
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+    ).select_from(shows), upcoming)
+    bq += lambda q: q.filter(shows.c.artist_id == db.bindparam('artist_id'))
+    bq += lambda q: q.outerjoin(Venue, shows.c.venue_id == Venue.id)
+    bq = _add_cutoff(bq, upcoming, shows)
+
+    # For past shows, display latest one first
+    if upcoming:
+        bq += lambda q: q.order_by(shows.c.start_time)
+    else:
+        bq += lambda q: q.order_by(shows.c.start_time.desc())
+
+    return _run(bq, artist_id=artist_id)
+
+
+def artist_calendar(artist_id, start, end):
+    shows = all_shows
+    bq = bakery(lambda s: s.query(
+        shows.c.id.label('id'),
+        shows.c.start_time.label('start_time'),
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+    ).select_from(shows))
+    bq += lambda q: q.filter(shows.c.artist_id == db.bindparam('artist_id'))
+    bq = _add_range(bq, shows)
+    bq += lambda q: q.outerjoin(Venue, shows.c.venue_id == Venue.id)
+    bq += lambda q: q.order_by(shows.c.start_time)
+
+    return bq(db.session()).params(artist_id=artist_id, start=start, end=end).all()
+
+#----------------------------------------------------------------------------#
+# Shows
+#----------------------------------------------------------------------------#
+
+def show_list(upcoming, time_range=None):
+    # Read from the denormalized listing: an index-ordered scan, no joins
+    shows = ShowListing.__table__
+    bq = bakery(lambda s: s.query(
+        shows.c.start_time.label('start_time'),
+        shows.c.artist_id.label('artist_id'),
+        shows.c.artist_name.label('artist_name'),
+        shows.c.artist_image_link.label('artist_image_link'),
+        shows.c.venue_id.label('venue_id'),
+        shows.c.venue_name.label('venue_name'),
+    ))
+    bq = _add_cutoff(bq, upcoming, shows)
+    if time_range:
+        bq = _add_range(bq, shows)
+
+    # For past shows, display latest one first
+    if upcoming:
+        bq += lambda q: q.order_by(shows.c.start_time, shows.c.artist_name, shows.c.venue_name)
+    else:
+        bq += lambda q: q.order_by(
+            shows.c.start_time.desc(),
+            shows.c.artist_name.desc(),
+            shows.c.venue_name.desc(),
+        )
+
+    if time_range:
+        return _stream(bq, start=time_range[0], end=time_range[1], **cutoff_params())
+    return _stream(bq, **cutoff_params())
+
+
+def show_count(upcoming, time_range=None):
+    shows = ShowListing.__table__
+    bq = bakery(lambda s: s.query(db.func.count(shows.c.id)))
+    bq = _add_cutoff(bq, upcoming, shows)
+    if time_range:
+        bq = _add_range(bq, shows)
+        return bq(db.session()).params(start=time_range[0], end=time_range[1], **cutoff_params()).scalar()
+    return bq(db.session()).params(**cutoff_params()).scalar()
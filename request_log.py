@@ -0,0 +1,188 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+import traceback
+import uuid
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# JSON Logging
+#----------------------------------------------------------------------------#
+
+logger = logging.getLogger('fyyur.requests')
+
+# Static files and load balancer probes are not logged
+SKIP_ENDPOINTS = ('static', 'health.healthz', 'health.readyz')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry['message'] = record.getMessage()
+            entry['where'] = f'{record.pathname}:{record.lineno}'
+        if has_request_context() and 'request_id' in g:
+            entry.setdefault('request_id', g.request_id)
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info))
+
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+#----------------------------------------------------------------------------#
+# SQL Counting
+#----------------------------------------------------------------------------#
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_start' in g:
+        context._request_log_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_request_log_start', None)
+    if start is not None and has_request_context():
+        g.sql_count += 1
+        g.sql_ms += (time.perf_counter() - start) * 1000
+
+#----------------------------------------------------------------------------#
+# Profiling
+#----------------------------------------------------------------------------#
+
+# cProfile only allows one active profiler per thread
+profiling = threading.local()
+
+
+def start_profile():
+    rate = current_app.config.get('PROFILE_SAMPLE_RATE', 0)
+    if not rate or random.random() >= rate or getattr(profiling, 'active', False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is already running
+        return None
+    profiling.active = True
+
+    return profile
+
+
+def save_profile(profile, duration_ms):
+    profile_dir = current_app.config['PROFILE_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+
+    endpoint = (request.endpoint or 'none').replace('.', '-')
+    name = f'{int(time.time() * 1000)}_{endpoint}_{int(duration_ms)}ms_{g.request_id[:8]}.prof'
+    path = os.path.join(profile_dir, name)
+    profile.dump_stats(path)
+    rotate_profiles(profile_dir)
+
+    return name
+
+
+def rotate_profiles(profile_dir):
+    # Keep only the newest profiles
+    keep = current_app.config.get('PROFILE_KEEP', 100)
+    names = sorted(n for n in os.listdir(profile_dir) if n.endswith('.prof'))
+    for name in names[:-keep] if keep else names:
+        try:
+            os.remove(os.path.join(profile_dir, name))
+        except FileNotFoundError:
+            pass
+
+#----------------------------------------------------------------------------#
+# Request Hooks
+#----------------------------------------------------------------------------#
+
+def start_request():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_ms = 0.0
+    g.profile = start_profile()
+
+
+def finish_request(response):
+    if 'request_start' not in g:
+        return response
+
+    response.headers['X-Request-ID'] = g.request_id
+    g.response_status = response.status_code
+
+    # Streamed bodies render after this hook; those are logged on teardown,
+    # once the last chunk has been produced
+    if not response.is_streamed:
+        complete_request()
+
+    return response
+
+
+def complete_request(exc=None):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+
+    duration_ms = (time.perf_counter() - start) * 1000
+    slow_ms = current_app.config.get('SLOW_REQUEST_MS', 500)
+
+    profile_name = None
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+        profiling.active = False
+        # Profiles are only kept for slow requests
+        if duration_ms >= slow_ms:
+            try:
+                profile_name = save_profile(profile, duration_ms)
+            except OSError:
+                logger.exception('Could not save profile')
+
+    if request.endpoint in SKIP_ENDPOINTS:
+        return
+
+    entry = {
+        'request_id': g.request_id,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': 500 if exc is not None else g.get('response_status'),
+        'duration_ms': round(duration_ms, 3),
+        'sql_count': g.sql_count,
+        'sql_ms': round(g.sql_ms, 3),
+        'slow': duration_ms >= slow_ms,
+    }
+    if profile_name:
+        entry['profile'] = profile_name
+    logger.log(logging.WARNING if entry['slow'] else logging.INFO, entry)
+
+
+def init_app(app):
+    if not logger.handlers:
+        if app.config.get('REQUEST_LOG_PATH'):
+            handler = logging.FileHandler(app.config['REQUEST_LOG_PATH'])
+        else:
+            handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(complete_request)
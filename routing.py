@@ -0,0 +1,148 @@
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+
+#----------------------------------------------------------------------------#
+# Replica Selection
+#----------------------------------------------------------------------------#
+
+REPLICA_PREFIX = 'replica_'
+
+
+def replica_binds(app):
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    return sorted(k for k in binds if k.startswith(REPLICA_PREFIX))
+
+
+def measure_lag(engine):
+    # Seconds the replica is behind the primary (0 for non-standby servers).
+    # The last replayed commit ages while the primary is idle, so a replica
+    # that has replayed everything it received counts as caught up
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            lag = conn.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+            ).scalar()
+            return float(lag or 0)
+        conn.execute('SELECT 1')
+        return 0.0
+
+
+class ReplicaSet:
+    def __init__(self):
+        self.counter = itertools.count()
+        self.lags = {}
+        self.lock = threading.Lock()
+
+    def lag(self, app, key, engine):
+        interval = app.config.get('REPLICA_LAG_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        with self.lock:
+            checked = self.lags.get(key)
+        if checked and now - checked[0] < interval:
+            return checked[1]
+
+        try:
+            lag = measure_lag(engine)
+        except Exception:
+            app.logger.warning('Replica %s is unreachable', key)
+            lag = float('inf')
+        with self.lock:
+            self.lags[key] = (now, lag)
+
+        return lag
+
+    def pick(self, db, app):
+        # Keep replicas that are reachable and not lagging too far behind
+        max_lag = app.config.get('REPLICA_MAX_LAG', 5)
+        candidates = []
+        for key in replica_binds(app):
+            engine = db.get_engine(app, bind=key)
+            if self.lag(app, key, engine) <= max_lag:
+                candidates.append(engine)
+        if not candidates:
+            return None
+
+        if app.config.get('REPLICA_STRATEGY') == 'least_connections':
+            return min(candidates, key=lambda e: getattr(e.pool, 'checkedout', lambda: 0)())
+        return candidates[next(self.counter) % len(candidates)]
+
+
+replicas = ReplicaSet()
+
+#----------------------------------------------------------------------------#
+# Read-only Views
+#----------------------------------------------------------------------------#
+
+def read_only(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+
+    return decorated
+
+
+def recently_wrote():
+    window = current_app.config.get('READ_YOUR_WRITES_WINDOW', 5)
+    return time.time() - session.get('last_write', 0) < window
+
+
+def mark_writes(response):
+    # Pin this client to the primary for a while after it writes
+    if request.method in ('POST', 'PUT', 'DELETE') and not g.get('read_only'):
+        session['last_write'] = time.time()
+
+    return response
+
+#----------------------------------------------------------------------------#
+# Session
+#----------------------------------------------------------------------------#
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and not self.info.get('wrote') and use_replica():
+            if 'replica' not in g:
+                g.replica = replicas.pick(get_state(self.app).db, self.app)
+            if g.replica is not None:
+                return g.replica
+
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+def use_replica():
+    return (
+        has_request_context()
+        and g.get('read_only', False)
+        and not recently_wrote()
+    )
+
+
+def _mark_session_written(session, flush_context):
+    session.info['wrote'] = True
+
+
+def _reset_session_written(session, *args):
+    session.info.pop('wrote', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def init_app(app):
+    app.after_request(mark_writes)
+
+
+def listen(db):
+    # Once a transaction writes, keep reading from the primary until it ends
+    db.event.listen(db.session, 'after_flush', _mark_session_written)
+    db.event.listen(db.session, 'after_commit', _reset_session_written)
+    db.event.listen(db.session, 'after_rollback', _reset_session_written)
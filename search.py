@@ -0,0 +1,154 @@
+import json
+
+from flask import current_app
+
+from models import db, Venue, Artist, Genre, venue_genre, artist_genre
+
+#----------------------------------------------------------------------------#
+# Facet Config
+#----------------------------------------------------------------------------#
+
+FACETS = ('genre', 'city', 'state', 'seeking')
+
+# Per-entity columns used to filter and count facets
+ENTITIES = {
+    'venue': {
+        'model': Venue,
+        'assoc': venue_genre,
+        'owner_id': venue_genre.c.venue_id,
+        'seeking': Venue.seeking_talent,
+    },
+    'artist': {
+        'model': Artist,
+        'assoc': artist_genre,
+        'owner_id': artist_genre.c.artist_id,
+        'seeking': Artist.seeking_venue,
+    },
+}
+
+#----------------------------------------------------------------------------#
+# Helpers
+#----------------------------------------------------------------------------#
+
+def get_filters(values):
+    return {
+        'genre': [g for g in values.getlist('genre') if g],
+        'city': values.get('city') or None,
+        'state': values.get('state') or None,
+        'seeking': values.get('seeking') or None,
+    }
+
+
+def get_page(values):
+    max_per_page = current_app.config.get('SEARCH_MAX_PER_PAGE', 100)
+    page = max(values.get('page', 1, type=int), 1)
+    per_page = values.get('per_page', current_app.config.get('SEARCH_PER_PAGE', 20), type=int)
+    per_page = min(max(per_page, 1), max_per_page)
+
+    return page, per_page
+
+
+def apply_filters(query, entity, filters):
+    e = ENTITIES[entity]
+    model = e['model']
+
+    # Look up owners through the (genre_id, owner_id) index, one genre at a time
+    for name in filters['genre']:
+        genre_ids = db.session.query(Genre.id).filter(Genre.name == name)
+        owner_ids = db.session.query(e['owner_id']).filter(
+            e['assoc'].c.genre_id.in_(genre_ids.subquery()),
+        )
+        query = query.filter(model.id.in_(owner_ids.subquery()))
+
+    if filters['city']:
+        query = query.filter(model.city == filters['city'])
+    if filters['state']:
+        query = query.filter(model.state == filters['state'])
+    if filters['seeking'] == 'yes':
+        query = query.filter(e['seeking'] == True)
+    elif filters['seeking'] == 'no':
+        query = query.filter(db.or_(e['seeking'] == False, e['seeking'] == None))
+
+    return query
+
+
+def facet_counts(entity, ids):
+    e = ENTITIES[entity]
+    model = e['model']
+    assoc = e['assoc']
+    seeking = db.case([(e['seeking'] == True, 'yes')], else_='no')
+
+    # Count every facet over the matched ids in a single round trip
+    facets = db.union_all(
+        db.select([
+            db.literal('genre').label('facet'),
+            Genre.name.label('value'),
+            db.func.count().label('n'),
+        ]).select_from(
+            assoc.join(Genre, assoc.c.genre_id == Genre.id),
+        ).where(
+            e['owner_id'].in_(ids),
+        ).group_by(
+            Genre.name,
+        ),
+        db.select([
+            db.literal('city').label('facet'),
+            model.city.label('value'),
+            db.func.count().label('n'),
+        ]).where(
+            model.id.in_(ids),
+        ).group_by(
+            model.city,
+        ),
+        db.select([
+            db.literal('state').label('facet'),
+            model.state.label('value'),
+            db.func.count().label('n'),
+        ]).where(
+            model.id.in_(ids),
+        ).group_by(
+            model.state,
+        ),
+        db.select([
+            db.literal('seeking').label('facet'),
+            seeking.label('value'),
+            db.func.count().label('n'),
+        ]).where(
+            model.id.in_(ids),
+        ).group_by(
+            seeking,
+        ),
+    )
+
+    counts = {f: [] for f in FACETS}
+    for row in db.session.execute(facets):
+        if row.value is not None:
+            counts[row.facet].append((row.value, row.n))
+    for f in FACETS:
+        counts[f].sort(key=lambda c: (-c[1], c[0]))
+
+    return counts
+
+
+def estimate_rows(query):
+    # Planner row estimate for the query (Postgres only)
+    compiled = query.statement.compile(dialect=db.session.get_bind().dialect)
+    plan = db.session.connection().execute(
+        'EXPLAIN (FORMAT JSON) ' + str(compiled),
+        compiled.params,
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_matches(query):
+    # Count exactly for narrow searches; trust the planner for broad ones
+    threshold = current_app.config.get('SEARCH_EXACT_COUNT_THRESHOLD', 1000)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        estimate = estimate_rows(query)
+        if estimate > threshold:
+            return estimate, False
+
+    return query.order_by(None).count(), True
@@ -2,3 +2,27 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Suggest venue/artist names while typing into the search boxes
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var pending = null;
+  input.addEventListener('input', function () {
+    var q = input.value.trim();
+    if (pending) { pending.abort(); }
+    if (!q) { list.innerHTML = ''; return; }
+    pending = new AbortController();
+    fetch('/autocomplete?type=' + input.dataset.autocomplete + '&q=' + encodeURIComponent(q), {
+      signal: pending.signal
+    }).then(function (response) {
+      return response.json();
+    }).then(function (body) {
+      list.innerHTML = '';
+      body.data.forEach(function (item) {
+        var option = document.createElement('option');
+        option.value = item.name;
+        list.appendChild(option);
+      });
+    }).catch(function () {});
+  });
+});
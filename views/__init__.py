@@ -0,0 +1,11 @@
+from views import main, venues, artists, shows, images, api, health
+
+
+def register_blueprints(app):
+    app.register_blueprint(main.bp)
+    app.register_blueprint(venues.bp)
+    app.register_blueprint(artists.bp)
+    app.register_blueprint(shows.bp)
+    app.register_blueprint(images.bp)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(health.bp)
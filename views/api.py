@@ -0,0 +1,84 @@
+import hmac
+import json
+
+from flask import (
+    Blueprint,
+    current_app,
+    request,
+    abort,
+    jsonify,
+    url_for,
+    Response,
+    stream_with_context,
+)
+
+from routing import read_only
+from changelog import changes_since, settle_time
+import popularity
+import jobs
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+#----------------------------------------------------------------------------#
+# Change Feed
+#----------------------------------------------------------------------------#
+
+@bp.route('/changes')
+@read_only
+def changes():
+    # Cursor is the id of the last change the client has seen
+    since = request.args.get('since', 0, type=int)
+    if since < 0:
+        abort(400)
+    max_limit = current_app.config.get('CHANGES_MAX_LIMIT', 10000)
+    limit = min(max(request.args.get('limit', 1000, type=int), 1), max_limit)
+    settle = settle_time()
+
+    # One JSON object per line, sent as rows are fetched
+    def generate():
+        for change in changes_since(since, limit, settle):
+            yield json.dumps(change.to_dict(), separators=(',', ':')) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+#----------------------------------------------------------------------------#
+# Popularity
+#----------------------------------------------------------------------------#
+
+@bp.route('/popular')
+@read_only
+def popular():
+    # Reads only the popularity summary table
+    kind = request.args.get('type', 'venue')
+    if kind not in popularity.KINDS:
+        abort(400)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+
+    data = popularity.top(kind, limit)
+    for d in data:
+        d['url'] = url_for(kind + 's.show_' + kind, **{kind + '_id': d['id']})
+
+    return jsonify({'type': kind, 'data': data})
+
+#----------------------------------------------------------------------------#
+# Jobs
+#----------------------------------------------------------------------------#
+
+def require_admin():
+    # Operator endpoints answer only requests carrying ADMIN_TOKEN
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        abort(404)
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(given.encode(), token.encode()):
+        abort(403)
+
+
+@bp.route('/jobs')
+def job_metrics():
+    # Timings of the jobs run by this worker
+    require_admin()
+    return jsonify({
+        'scheduler': jobs.scheduler is not None,
+        'jobs': [job.metrics() for job in jobs.JOBS.values()],
+    })
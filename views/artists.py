@@ -0,0 +1,336 @@
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    flash,
+    redirect,
+    url_for,
+    abort,
+    jsonify,
+)
+
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Artist, Show
+from search import get_filters, get_page, apply_filters, facet_counts, count_matches
+from routing import read_only
+from dedupe import find_duplicates
+from matchmaking import index as match_index, ensure_index as ensure_match_index
+from helpers import stream_template, time_now, get_time_range, get_genre, apply_changes, sync_genres, package_facets, package_pages
+import queries
+
+bp = Blueprint('artists', __name__)
+
+#----------------------------------------------------------------------------#
+# Artists
+#----------------------------------------------------------------------------#
+
+@bp.route('/artists')
+@read_only
+def artists():
+    # Rows go straight to the template as they are fetched
+    artists = queries.artist_list()
+
+    return stream_template('pages/artists.html', artists=artists)
+
+
+@bp.route('/artists/search', methods=['GET', 'POST'])
+@read_only
+def search_artists():
+    # Get search terms and facet filters
+    search_term = request.values.get('search_term', '')
+    filters = get_filters(request.values)
+    page, per_page = get_page(request.values)
+
+    # Identify upcoming shows
+    new_shows = db.session.query(
+        Show.id.label('id'),
+        Show.artist_id.label('artist_id'),
+    ).filter(
+        Show.start_time > queries.show_cutoff(),
+    ).subquery()
+
+    # Identify matching artists
+    matched = apply_filters(
+        db.session.query(Artist.id).filter(
+            Artist.name.ilike("%{}%".format(search_term)),
+        ),
+        'artist',
+        filters,
+    )
+
+    # Search artists
+    artist_list = db.session.query(
+        Artist.id.label('id'),
+        Artist.name.label('name'),
+        db.func.count(new_shows.c.id).label('n_new_show'),
+    ).filter(
+        Artist.id.in_(matched.subquery()),
+    ).outerjoin(
+        new_shows,
+        Artist.id == new_shows.c.artist_id,
+    ).group_by(
+        Artist.id,
+    ).order_by(
+        Artist.name,
+    ).limit(
+        per_page,
+    ).offset(
+        (page - 1) * per_page,
+    ).params(
+        **queries.cutoff_params(),
+    ).all()
+
+    # Count all matches separately from the page
+    total, exact = count_matches(matched)
+
+    # Package response data
+    response = {'count': total, 'exact': exact, 'data': []}
+    for a in artist_list:
+        response['data'].append({
+            'id': a.id,
+            'name': a.name,
+            'num_upcoming_shows': a.n_new_show,
+        })
+
+    # Count facet values over the same matches
+    counts = facet_counts('artist', matched.subquery())
+    facets = package_facets('artists.search_artists', search_term, filters, counts)
+    pages = package_pages('artists.search_artists', search_term, filters, page, per_page, total)
+
+    return render_template(
+        'pages/search_artists.html',
+        results=response,
+        search_term=search_term,
+        facets=facets,
+        pages=pages,
+    )
+
+
+@bp.route('/artists/<int:artist_id>')
+@read_only
+def show_artist(artist_id):
+    # Get artist info
+    a = Artist.query.get(artist_id)
+    if not a:
+        abort(404)
+
+    # Identify past and upcoming shows; rows are rendered as fetched
+    old_shows = queries.artist_shows(artist_id, upcoming=False)
+    new_shows = queries.artist_shows(artist_id, upcoming=True)
+
+    # Package data to render
+    data = a.to_dict()
+    data['past_shows'] = old_shows
+    data['past_shows_count'] = len(old_shows)
+    data['upcoming_shows'] = new_shows
+    data['upcoming_shows_count'] = len(new_shows)
+
+    return render_template('pages/show_artist.html', artist=data)
+
+
+@bp.route('/artists/<int:artist_id>/calendar')
+@read_only
+def artist_calendar(artist_id):
+    if not Artist.query.get(artist_id):
+        abort(404)
+
+    # Default to the current month
+    time_range = get_time_range(request.args)
+    if not time_range:
+        time_range = get_time_range({'month': time_now().strftime('%Y-%m')})
+    start, end = time_range
+
+    # Package response data
+    data = []
+    for s in queries.artist_calendar(artist_id, start, end):
+        data.append({
+            'id': s.id,
+            'start_time': s.start_time.isoformat(),
+            'venue_id': s.venue_id,
+            'venue_name': s.venue_name,
+        })
+
+    return jsonify({
+        'artist_id': artist_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'shows': data,
+    })
+
+
+@bp.route('/artists/<int:artist_id>/recommendations')
+def artist_recommendations(artist_id):
+    ensure_match_index()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+
+    # Rank venues from the in-memory match index
+    matches = match_index.recommend('artist', artist_id, limit=limit)
+    if matches is None:
+        abort(404)
+    for m in matches:
+        m['url'] = url_for('venues.show_venue', venue_id=m['id'])
+
+    return jsonify({'artist_id': artist_id, 'venues': matches})
+
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  # WTForms is imported on first use to keep app startup fast
+  from forms import ArtistForm
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist():
+    a = Artist(
+        name = request.form.get('name'),
+        city = request.form.get('city'),
+        state = request.form.get('state'),
+        phone = request.form.get('phone'),
+        image_link = request.form.get('image_link'),
+        facebook_link = request.form.get('facebook_link'),
+        website = request.form.get('website'),
+        seeking_venue = True if request.form.get('seeking_venue') else False,
+        seeking_description = request.form.get('seeking_description'),
+    )
+    a.genres = [get_genre(name=g) for g in request.form.getlist('genres')]
+
+    # Look for likely duplicates through the indexed blocking keys
+    duplicates = find_duplicates(Artist, a.name, a.city, a.state)
+
+    error = False
+    try:
+        db.session.add(a)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Database write failed')
+    finally:
+        db.session.close()
+    if error:
+        flash('An error occurred. Artist \"' + request.form.get('name') + '\" could not be listed.')
+        abort(400)
+    else:
+        flash('Artist \"' + request.form.get('name') + '\" was successfully listed!')
+        for d in duplicates:
+            flash('Warning: this may duplicate artist \"' + d.name + '\" <ID: ' + str(d.id) + '> in ' + str(d.city) + ', ' + str(d.state) + '.')
+
+    return render_template('pages/home.html')
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist_form(artist_id):
+    a = Artist.query.get(artist_id)
+    if not a:
+        abort(404)
+    artist = a.to_dict()
+
+    # Populate form with existing values
+    from forms import ArtistForm
+    form = ArtistForm()
+    form.name.data = artist['name']
+    form.city.data = artist['city']
+    form.state.data = artist['state']
+    form.phone.data = artist['phone']
+    form.image_link.data = artist['image_link']
+    form.facebook_link.data = artist['facebook_link']
+    form.website.data = artist['website']
+    form.seeking_venue.data = artist['seeking_venue']
+    form.seeking_description.data = artist['seeking_description']
+    form.genres.data = artist['genres']
+    form.version.data = artist['version']
+
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist(artist_id):
+    a = Artist.query.get(artist_id)
+    if not a:
+        abort(404)
+    aid = a.id
+
+    # Reject edits made against an outdated copy of the artist
+    version = request.form.get('version', type=int)
+    if version is not None and version != a.version:
+        flash('Artist <ID: ' + str(aid) + '> was changed by someone else. Please reload and try again.')
+        abort(409)
+
+    # Update only the artist info that changed
+    changed = apply_changes(a, {
+        'name': request.form.get('name'),
+        'city': request.form.get('city'),
+        'state': request.form.get('state'),
+        'phone': request.form.get('phone'),
+        'image_link': request.form.get('image_link'),
+        'facebook_link': request.form.get('facebook_link'),
+        'website': request.form.get('website'),
+        'seeking_venue': True if request.form.get('seeking_venue') else False,
+        'seeking_description': request.form.get('seeking_description'),
+    })
+    if sync_genres(a, request.form.getlist('genres')) and not changed:
+        # Genre links live in another table; still bump the version
+        a.version = a.version + 1
+        changed = ['genres']
+
+    if not changed:
+        flash('Artist <ID: ' + str(aid) + '> has no changes.')
+        return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+    # Save into database
+    error = False
+    conflict = False
+    try:
+        db.session.commit()
+    except StaleDataError:
+        conflict = True
+        db.session.rollback()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Database write failed')
+    finally:
+        db.session.close()
+    if conflict:
+        flash('Artist <ID: ' + str(aid) + '> was changed by someone else. Please reload and try again.')
+        abort(409)
+    if error:
+        flash('An error occurred. Artist <ID: ' + str(aid) + '> could not be updated.')
+        abort(400)
+    else:
+        flash('Artist <ID: ' + str(aid) + '> was successfully updated!')
+
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+
+@bp.route('/artists/<artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    a = Artist.query.get(artist_id)
+    if not a:
+        abort(404)
+    artist_name = a.name
+    error = False
+
+    try:
+        for s in a.shows:
+            db.session.delete(s)
+        db.session.delete(a)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Database write failed')
+    finally:
+        db.session.close()
+
+    if error:
+        flash('An error occurred. Artist \"' + artist_name + '\" could not be deleted.')
+        abort(400)
+    else:
+        flash('Artist \"' + artist_name + '\" was successfully deleted!')
+
+    return redirect(url_for('main.index'))
@@ -0,0 +1,40 @@
+from flask import (
+    Blueprint,
+    current_app,
+    jsonify,
+)
+
+import warmup
+
+bp = Blueprint('health', __name__)
+
+#----------------------------------------------------------------------------#
+# Probes
+#----------------------------------------------------------------------------#
+
+@bp.route('/healthz')
+def healthz():
+    # Liveness: the process can serve requests at all
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/readyz')
+def readyz():
+    # Readiness: warmed up and the database answers in time
+    timeout = current_app.config.get('READY_TIMEOUT', 2)
+    app = current_app._get_current_object()
+    ok, database = warmup.check_database(app, timeout)
+    ready = ok and warmup.status['state'] == 'warm'
+    if warmup.status['state'] == 'failed':
+        # Not ready this time; try again in the background
+        warmup.retry_warm_up(app)
+
+    response = jsonify({
+        'status': 'ready' if ready else 'unavailable',
+        'warm_up': warmup.status,
+        'database': database,
+    })
+    response.status_code = 200 if ready else 503
+    response.headers['Cache-Control'] = 'no-store'
+
+    return response
@@ -0,0 +1,38 @@
+from flask import (
+    Blueprint,
+    current_app,
+    request,
+    abort,
+    make_response,
+)
+
+from images import FetchError, get_thumbnail, sniff_type, verify
+
+bp = Blueprint('images', __name__)
+
+#----------------------------------------------------------------------------#
+# Image Proxy
+#----------------------------------------------------------------------------#
+
+@bp.route('/img/<int:width>')
+def thumbnail(width):
+    # Only resize to known widths, and only for links the app signed
+    url = request.args.get('url', '')
+    if width not in current_app.config.get('IMAGE_WIDTHS', (200, 400, 800)):
+        abort(404)
+    if not verify(url, request.args.get('sig')):
+        abort(404)
+
+    try:
+        key, data = get_thumbnail(url, width)
+    except FetchError as e:
+        current_app.logger.warning('Could not proxy image %s: %s', url, e)
+        abort(404)
+
+    # Thumbnails never change for a given URL and width
+    response = make_response(data)
+    response.mimetype = sniff_type(data) or 'application/octet-stream'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.set_etag(key)
+
+    return response.make_conditional(request)
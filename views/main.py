@@ -0,0 +1,83 @@
+from flask import (
+    Blueprint,
+    render_template,
+    request,
+    url_for,
+    abort,
+    jsonify,
+)
+
+from routing import read_only
+from breaker import breaker
+from autocomplete import index as name_index, ensure_index
+from popularity import top
+
+bp = Blueprint('main', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers
+#----------------------------------------------------------------------------#
+
+@bp.route('/')
+@read_only
+def index():
+  # Trending venues and artists, from the popularity summary table
+  return render_template(
+    'pages/home.html',
+    popular_venues=top('venue', 5),
+    popular_artists=top('artist', 5),
+  )
+
+
+@bp.route('/autocomplete')
+def autocomplete():
+    ensure_index()
+
+    # Get search terms
+    q = request.args.get('q', '')
+    kind = request.args.get('type')
+    if kind not in (None, 'venue', 'artist'):
+        abort(400)
+    limit = min(request.args.get('limit', 10, type=int), 50)
+
+    # Package response data
+    data = []
+    for k, id, name in name_index.search(q, kind=kind, limit=limit):
+        data.append({
+            'type': k,
+            'id': id,
+            'name': name,
+            'url': url_for(k + 's.show_' + k, **{k + '_id': id}),
+        })
+
+    return jsonify({'data': data})
+
+#----------------------------------------------------------------------------#
+# Error Handlers
+#----------------------------------------------------------------------------#
+
+@bp.app_errorhandler(400)
+def bad_request_error(error):
+    return render_template('errors/400.html'), 400
+
+
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+
+@bp.app_errorhandler(409)
+def conflict_error(error):
+    return render_template('errors/409.html'), 409
+
+
+@bp.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500
+
+
+@bp.app_errorhandler(503)
+def unavailable_error(error):
+    # The circuit breaker is open
+    return render_template('errors/503.html'), 503, {'Retry-After': str(breaker.retry_after())}
+
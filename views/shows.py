@@ -0,0 +1,78 @@
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    flash,
+    abort,
+)
+
+from models import db, Venue, Artist, Show
+from routing import read_only
+from helpers import get_time_range, stream_template
+import queries
+
+bp = Blueprint('shows', __name__)
+
+#----------------------------------------------------------------------------#
+# Shows
+#----------------------------------------------------------------------------#
+
+@bp.route('/shows')
+@read_only
+def shows():
+    # Optionally limit to a time range
+    time_range = get_time_range(request.args)
+
+    # Rows are fetched lazily while the page streams; counts come first
+    # since they are shown above each list
+    data = {
+        'past_shows': queries.show_list(upcoming=False, time_range=time_range),
+        'past_shows_count': queries.show_count(upcoming=False, time_range=time_range),
+        'upcoming_shows': queries.show_list(upcoming=True, time_range=time_range),
+        'upcoming_shows_count': queries.show_count(upcoming=True, time_range=time_range),
+    }
+
+    return stream_template('pages/shows.html', shows=data)
+
+
+@bp.route('/shows/create')
+def create_show_form():
+    # WTForms is imported on first use to keep app startup fast
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show():
+    if not Artist.query.get(request.form['artist_id']):
+        flash('Error: Artist does not exist.')
+        abort(400)
+    if not Venue.query.get(request.form['venue_id']):
+        flash('Error: Venue does not exist.')
+        abort(400)
+
+    s = Show(
+        start_time = request.form.get('start_time'),
+        artist_id = request.form.get('artist_id'),
+        venue_id = request.form.get('venue_id'),
+    )
+
+    error = False
+    try:
+        db.session.add(s)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Database write failed')
+    finally:
+        db.session.close()
+    if error:
+        flash('An error occurred. Show could not be listed.')
+        abort(400)
+    else:
+        flash('Show was successfully listed!')
+
+    return render_template('pages/home.html')
@@ -0,0 +1,346 @@
+import itertools
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    flash,
+    redirect,
+    url_for,
+    abort,
+    jsonify,
+)
+
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Venue, Show
+from search import get_filters, get_page, apply_filters, facet_counts, count_matches
+from routing import read_only
+from dedupe import find_duplicates
+from matchmaking import index as match_index, ensure_index as ensure_match_index
+from helpers import stream_template, time_now, get_time_range, get_genre, apply_changes, sync_genres, package_facets, package_pages
+import queries
+
+bp = Blueprint('venues', __name__)
+
+#----------------------------------------------------------------------------#
+# Venues
+#----------------------------------------------------------------------------#
+
+@bp.route('/venues')
+@read_only
+def venues():
+    # Get venue info, ordered by area so that it can be grouped as it streams
+    venue_list = queries.venue_list()
+
+    # Package data to render, one area at a time; venue rows pass through
+    areas = (
+        {'city': city, 'state': state, 'venues': rows}
+        for (city, state), rows in itertools.groupby(venue_list, key=lambda v: (v.city, v.state))
+    )
+
+    return stream_template('pages/venues.html', areas=areas)
+
+
+@bp.route('/venues/search', methods=['GET', 'POST'])
+@read_only
+def search_venues():
+    # Get search terms and facet filters
+    search_term = request.values.get('search_term', '')
+    filters = get_filters(request.values)
+    page, per_page = get_page(request.values)
+
+    # Identify upcoming shows
+    new_shows = db.session.query(
+        Show.id.label('id'),
+        Show.venue_id.label('venue_id'),
+    ).filter(
+        Show.start_time > queries.show_cutoff(),
+    ).subquery()
+
+    # Identify matching venues
+    matched = apply_filters(
+        db.session.query(Venue.id).filter(
+            Venue.name.ilike("%{}%".format(search_term)),
+        ),
+        'venue',
+        filters,
+    )
+
+    # Search venues
+    venue_list = db.session.query(
+        Venue.id.label('id'),
+        Venue.name.label('name'),
+        db.func.count(new_shows.c.id).label('n_new_show'),
+    ).filter(
+        Venue.id.in_(matched.subquery()),
+    ).outerjoin(
+        new_shows,
+        Venue.id == new_shows.c.venue_id,
+    ).group_by(
+        Venue.id,
+    ).order_by(
+        Venue.name,
+    ).limit(
+        per_page,
+    ).offset(
+        (page - 1) * per_page,
+    ).params(
+        **queries.cutoff_params(),
+    ).all()
+
+    # Count all matches separately from the page
+    total, exact = count_matches(matched)
+
+    # Package response data
+    response = {'count': total, 'exact': exact, 'data': []}
+    for v in venue_list:
+        response['data'].append({
+            'id': v.id,
+            'name': v.name,
+            'num_upcoming_shows': v.n_new_show,
+        })
+
+    # Count facet values over the same matches
+    counts = facet_counts('venue', matched.subquery())
+    facets = package_facets('venues.search_venues', search_term, filters, counts)
+    pages = package_pages('venues.search_venues', search_term, filters, page, per_page, total)
+
+    return render_template(
+        'pages/search_venues.html',
+        results=response,
+        search_term=search_term,
+        facets=facets,
+        pages=pages,
+    )
+
+
+@bp.route('/venues/<int:venue_id>')
+@read_only
+def show_venue(venue_id):
+    # Get venue info
+    v = Venue.query.get(venue_id)
+    if not v:
+        abort(404)
+
+    # Identify past and upcoming shows; rows are rendered as fetched
+    old_shows = queries.venue_shows(venue_id, upcoming=False)
+    new_shows = queries.venue_shows(venue_id, upcoming=True)
+
+    # Package data to render
+    data = v.to_dict()
+    data['past_shows'] = old_shows
+    data['past_shows_count'] = len(old_shows)
+    data['upcoming_shows'] = new_shows
+    data['upcoming_shows_count'] = len(new_shows)
+
+    return render_template('pages/show_venue.html', venue=data)
+
+
+@bp.route('/venues/<int:venue_id>/calendar')
+@read_only
+def venue_calendar(venue_id):
+    if not Venue.query.get(venue_id):
+        abort(404)
+
+    # Default to the current month
+    time_range = get_time_range(request.args)
+    if not time_range:
+        time_range = get_time_range({'month': time_now().strftime('%Y-%m')})
+    start, end = time_range
+
+    # Package response data
+    data = []
+    for s in queries.venue_calendar(venue_id, start, end):
+        data.append({
+            'id': s.id,
+            'start_time': s.start_time.isoformat(),
+            'artist_id': s.artist_id,
+            'artist_name': s.artist_name,
+        })
+
+    return jsonify({
+        'venue_id': venue_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'shows': data,
+    })
+
+
+@bp.route('/venues/<int:venue_id>/recommendations')
+def venue_recommendations(venue_id):
+    ensure_match_index()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+
+    # Rank artists from the in-memory match index
+    matches = match_index.recommend('venue', venue_id, limit=limit)
+    if matches is None:
+        abort(404)
+    for m in matches:
+        m['url'] = url_for('artists.show_artist', artist_id=m['id'])
+
+    return jsonify({'venue_id': venue_id, 'artists': matches})
+
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    # WTForms is imported on first use to keep app startup fast
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue():
+    v = Venue(
+        name = request.form.get('name'),
+        city = request.form.get('city'),
+        state = request.form.get('state'),
+        address = request.form.get('address'),
+        phone = request.form.get('phone'),
+        image_link = request.form.get('image_link'),
+        facebook_link = request.form.get('facebook_link'),
+        website = request.form.get('website'),
+        seeking_talent = True if request.form.get('seeking_talent') else False,
+        seeking_description = request.form.get('seeking_description'),
+    )
+    v.genres = [get_genre(name=g) for g in request.form.getlist('genres')]
+
+    # Look for likely duplicates through the indexed blocking keys
+    duplicates = find_duplicates(Venue, v.name, v.city, v.state)
+
+    error = False
+    try:
+        db.session.add(v)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Database write failed')
+    finally:
+        db.session.close()
+    if error:
+        flash('An error occurred. Venue \"' + request.form.get('name') + '\" could not be listed.')
+        abort(400)
+    else:
+        flash('Venue \"' + request.form.get('name') + '\" was successfully listed!')
+        for d in duplicates:
+            flash('Warning: this may duplicate venue \"' + d.name + '\" <ID: ' + str(d.id) + '> in ' + str(d.city) + ', ' + str(d.state) + '.')
+
+    return render_template('pages/home.html')
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue_form(venue_id):
+    v = Venue.query.get(venue_id)
+    if not v:
+        abort(404)
+    venue = v.to_dict()
+
+    # Populate form with existing values
+    from forms import VenueForm
+    form = VenueForm()
+    form.name.data = venue['name']
+    form.city.data = venue['city']
+    form.state.data = venue['state']
+    form.address.data = venue['address']
+    form.phone.data = venue['phone']
+    form.image_link.data = venue['image_link']
+    form.facebook_link.data = venue['facebook_link']
+    form.website.data = venue['website']
+    form.seeking_talent.data = venue['seeking_talent']
+    form.seeking_description.data = venue['seeking_description']
+    form.genres.data = venue['genres']
+    form.version.data = venue['version']
+
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue(venue_id):
+    v = Venue.query.get(venue_id)
+    if not v:
+        abort(404)
+    vid = v.id
+
+    # Reject edits made against an outdated copy of the venue
+    version = request.form.get('version', type=int)
+    if version is not None and version != v.version:
+        flash('Venue <ID: ' + str(vid) + '> was changed by someone else. Please reload and try again.')
+        abort(409)
+
+    # Update only the venue info that changed
+    changed = apply_changes(v, {
+        'name': request.form.get('name'),
+        'city': request.form.get('city'),
+        'state': request.form.get('state'),
+        'address': request.form.get('address'),
+        'phone': request.form.get('phone'),
+        'image_link': request.form.get('image_link'),
+        'facebook_link': request.form.get('facebook_link'),
+        'website': request.form.get('website'),
+        'seeking_talent': True if request.form.get('seeking_talent') else False,
+        'seeking_description': request.form.get('seeking_description'),
+    })
+    if sync_genres(v, request.form.getlist('genres')) and not changed:
+        # Genre links live in another table; still bump the version
+        v.version = v.version + 1
+        changed = ['genres']
+
+    if not changed:
+        flash('Venue <ID: ' + str(vid) + '> has no changes.')
+        return redirect(url_for('venues.show_venue', venue_id=venue_id))
+
+    # Save into database
+    error = False
+    conflict = False
+    try:
+        db.session.commit()
+    except StaleDataError:
+        conflict = True
+        db.session.rollback()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Database write failed')
+    finally:
+        db.session.close()
+    if conflict:
+        flash('Venue <ID: ' + str(vid) + '> was changed by someone else. Please reload and try again.')
+        abort(409)
+    if error:
+        flash('An error occurred. Venue <ID: ' + str(vid) + '> could not be updated.')
+        abort(400)
+    else:
+        flash('Venue <ID: ' + str(vid) + '> was successfully updated!')
+
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
+
+
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    v = Venue.query.get(venue_id)
+    if not v:
+        abort(404)
+    venue_name = v.name
+    error = False
+
+    try:
+        for s in v.shows:
+            db.session.delete(s)
+        db.session.delete(v)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Database write failed')
+    finally:
+        db.session.close()
+
+    if error:
+        flash('An error occurred. Venue \"' + venue_name + '\" could not be deleted.')
+        abort(400)
+    else:
+        flash('Venue \"' + venue_name + '\" was successfully deleted!')
+
+    return redirect(url_for('main.index'))
@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from models import db
+from autocomplete import ensure_index
+from matchmaking import ensure_index as ensure_match_index
+from routing import replica_binds
+
+#----------------------------------------------------------------------------#
+# Engines
+#----------------------------------------------------------------------------#
+
+def get_engines(app):
+    engines = [db.get_engine(app)]
+    engines.extend(db.get_engine(app, bind=key) for key in replica_binds(app))
+
+    return engines
+
+
+def reset_engines(app):
+    # Give a forked worker fresh pools without closing the parent's
+    # connections, so no pooled connection is ever shared between processes
+    with app.app_context():
+        for engine in get_engines(app):
+            engine.pool = engine.pool.recreate()
+
+#----------------------------------------------------------------------------#
+# Warm-up
+#----------------------------------------------------------------------------#
+
+# Per-process warm-up progress, reported by /readyz
+status = {'state': 'cold', 'steps': {}, 'error': None}
+lock = threading.Lock()
+
+# Failed warm-ups are retried in the background, one at a time
+warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='warmup')
+retry_lock = threading.Lock()
+retrying = None
+# Connections per engine, as the server last asked for
+settings = {'connections': 1}
+
+
+def precompile_templates(app):
+    # Parse and compile every template into the environment's cache
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
+
+
+def open_connections(app, connections=1):
+    # Open pool connections so the first requests don't pay for connecting
+    for engine in get_engines(app):
+        conns = [engine.connect() for _ in range(connections)]
+        for conn in conns:
+            conn.execute('SELECT 1')
+            conn.close()
+
+
+def import_modules():
+    # Modules the app imports on first use rather than at startup
+    import forms
+
+
+def load_caches():
+    ensure_index()
+    ensure_match_index()
+    db.session.remove()
+
+
+def warm_up(app, connections=None):
+    # Returns whether the process is warm; a failed step leaves it 'failed'
+    # and not ready, rather than stopping the worker
+    with lock:
+        if status['state'] == 'warm':
+            return True
+        if connections is not None:
+            settings['connections'] = connections
+        connections = settings['connections']
+        status.update(state='warming', steps={}, error=None)
+        steps = (
+            ('templates', lambda: precompile_templates(app)),
+            ('modules', import_modules),
+            ('connections', lambda: open_connections(app, connections)),
+            ('caches', load_caches),
+        )
+        with app.app_context():
+            for name, step in steps:
+                start = time.perf_counter()
+                try:
+                    step()
+                except Exception as e:
+                    status.update(state='failed', error=f'{name}: {e}')
+                    app.logger.exception('Warm-up step %s failed', name)
+                    return False
+                finally:
+                    status['steps'][name] = round((time.perf_counter() - start) * 1000, 3)
+        status['state'] = 'warm'
+        return True
+
+
+def retry_warm_up(app):
+    global retrying
+    with retry_lock:
+        if status['state'] != 'failed' or (retrying is not None and not retrying.done()):
+            return
+        retrying = warmer.submit(warm_up, app)
+
+#----------------------------------------------------------------------------#
+# Readiness
+#----------------------------------------------------------------------------#
+
+# One probe thread; a probe still stuck on a hung database is reported
+# rather than queued behind
+checker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='readyz')
+check_lock = threading.Lock()
+pending = None
+
+
+def ping(app):
+    results = {}
+    with app.app_context():
+        names = ['primary'] + list(replica_binds(app))
+        for name, engine in zip(names, get_engines(app)):
+            start = time.perf_counter()
+            conn = engine.connect()
+            try:
+                conn.execute('SELECT 1')
+            finally:
+                conn.close()
+            results[name] = {
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'pool': engine.pool.status(),
+            }
+
+    return results
+
+
+def check_database(app, timeout):
+    # Returns (ok, details) within `timeout` seconds
+    global pending
+    with check_lock:
+        if pending is not None and not pending.done():
+            return False, {'error': 'previous check still running'}
+        pending = future = checker.submit(ping, app)
+    try:
+        return True, future.result(timeout=timeout)
+    except TimeoutError:
+        return False, {'error': f'no response within {timeout}s'}
+    except Exception as e:
+        return False, {'error': str(e)}
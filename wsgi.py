@@ -0,0 +1,10 @@
+from app import create_app
+
+#----------------------------------------------------------------------------#
+# Production Entry Point
+#----------------------------------------------------------------------------#
+
+# Run with e.g.:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+
+app = create_app()